@@ -0,0 +1,90 @@
+"""
+Compares the optimal bipartite matching of LinearAssignment, with the SciPy and NumPy backends, with the original
+formulation of the optimal matching, where the cost matrix is padded to a dense square of 1 - rsquare, on random
+LD-like cost matrices of different sizes, and checks that all give the same total match score.
+
+The padded square is solved with scipy.optimize.linear_sum_assignment. Before SciPy 1.4, linear_sum_assignment is
+the Hungarian algorithm in pure Python, which takes minutes for a thousand SNPs, so the padded square and the SciPy
+backend are only run for sizes up to maxScipySize.
+
+Usage: python LinearAssignmentBenchmark.py [maxScipySize] [repeats]
+"""
+import sys
+import time
+
+import numpy as np
+import scipy
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix
+
+from quick.webtools.clustering.LinearAssignment import LinearAssignment
+
+REGION_LENGTH = 10000000
+LD_DISTANCE = 50000
+EDGE_PROBABILITY = 0.3
+SNP_COUNTS = [100, 500, 1000, 2000, 5000]
+
+
+def getCostMatrix(random, snpCount):
+    """Rsquare values between SNPs within LD_DISTANCE of each other, in two random tracks, as a sparse matrix."""
+    positions1 = np.sort(random.randint(0, REGION_LENGTH, snpCount))
+    positions2 = np.sort(random.randint(0, REGION_LENGTH, snpCount))
+
+    starts = np.searchsorted(positions2, positions1 - LD_DISTANCE, side='left')
+    counts = np.searchsorted(positions2, positions1 + LD_DISTANCE, side='right') - starts
+    rows = np.repeat(np.arange(snpCount), counts)
+    cols = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    isEdge = random.rand(len(rows)) < EDGE_PROBABILITY
+    return csr_matrix((random.rand(isEdge.sum()), (rows[isEdge], cols[isEdge])), shape=(snpCount, snpCount))
+
+
+def paddedMatchScore(costMatrix):
+    """The original formulation: a dense square of 1 - rsquare, with a cost of 1 for cells without an edge."""
+    dim = max(costMatrix.shape)
+    paddedMatrix = np.ones((dim, dim))
+    paddedMatrix[:costMatrix.shape[0], :costMatrix.shape[1]] = 1 - costMatrix.toarray()
+    rows, cols = linear_sum_assignment(paddedMatrix)
+    isCell = (rows < costMatrix.shape[0]) & (cols < costMatrix.shape[1])
+    return costMatrix[rows[isCell], cols[isCell]].sum()
+
+
+def matchScore(costMatrix, backend):
+    rows, cols = LinearAssignment.findMaximumMatching(costMatrix, backend)
+    return costMatrix[rows, cols].sum()
+
+
+def timeCall(function, repeats):
+    start = time.time()
+    for _ in range(repeats):
+        result = function()
+    return result, (time.time() - start) / repeats
+
+
+def main():
+    maxScipySize = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    random = np.random.RandomState(0)
+
+    print 'SciPy %s, default backend: %s' % (scipy.__version__, LinearAssignment.getDefaultBackend())
+    print 'SNPs\tEdges\tPadded (s)\tSciPy (s)\tNumPy (s)\tScore\tEqual'
+    for snpCount in SNP_COUNTS:
+        costMatrix = getCostMatrix(random, snpCount)
+
+        numpyScore, numpyTime = timeCall(lambda: matchScore(costMatrix, LinearAssignment.NUMPY), repeats)
+        isEqual = True
+        paddedTime = '-'
+        scipyTime = '-'
+        if snpCount <= maxScipySize:
+            paddedScore, paddedTime = timeCall(lambda: paddedMatchScore(costMatrix), repeats)
+            scipyScore, scipyTime = timeCall(lambda: matchScore(costMatrix, LinearAssignment.SCIPY), repeats)
+            isEqual = abs(numpyScore - paddedScore) < 1e-9 and abs(numpyScore - scipyScore) < 1e-9
+            paddedTime = '%.4f' % paddedTime
+            scipyTime = '%.4f' % scipyTime
+
+        print '%i\t%i\t%s\t%s\t%.4f\t%.4f\t%s' % (
+            snpCount, costMatrix.nnz, paddedTime, scipyTime, numpyTime, numpyScore, isEqual
+        )
+
+
+if __name__ == '__main__':
+    main()
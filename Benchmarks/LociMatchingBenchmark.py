@@ -0,0 +1,125 @@
+"""
+Compares the locus matching of the block and fuzzy statistics with the original two-pointer merge, on random
+chromosome-sized tracks, and checks that both give exactly the same counts.
+
+Usage: python LociMatchingBenchmark.py [snpCount] [repeats]
+"""
+import sys
+import time
+
+import numpy as np
+
+from quick.statistic.DistanceMetricsBlockFoundationStat import DistanceMetricsBlockFoundationStatUnsplittable
+from quick.statistic.DistanceMetricsFuzzyFoundationStat import DistanceMetricsFuzzyFoundationStatUnsplittable
+from quick.statistic.FilterSNPStat import FilterSNPStatUnsplittable
+
+CHROMOSOME_LENGTH = 250000000
+GENETIC_LOCI = [500000, 100000, 10000, 1000]
+
+
+def blockMatch(snp1, snp2, threshold):
+    return 1, 0, 0
+
+
+def fuzzyMatch(snp1, snp2, threshold):
+    from math import exp
+
+    if snp1 == snp2:
+        return 1, 0, 0
+
+    bell_width = threshold / 2.0
+    numerator = (float(snp2) - float(snp1)) ** 2
+    denominator = 2 * bell_width ** 2
+    a = exp(- (numerator / denominator))
+    return a, (1 - a) / 2, (1 - a) / 2
+
+
+def referenceCountMatches(snps1, snps2, threshold, computeMatch):
+    """The original two-pointer merge, one SNP at a time."""
+    a = 0
+    b = 0
+    c = 0
+    snp1len = len(snps1)
+    snp2len = len(snps2)
+
+    i, j = (0, 0)
+    while i < snp1len and j < snp2len:
+        snp1 = snps1[i]
+        snp2 = snps2[j]
+
+        if abs(snp1 - snp2) <= threshold:
+            a_val, b_val, c_val = computeMatch(snp1, snp2, threshold)
+            a += a_val
+            b += b_val
+            c += c_val
+            i += 1
+            j += 1
+        elif snp1 < snp2:
+            b += 1
+            i += 1
+        elif snp1 > snp2:
+            c += 1
+            j += 1
+
+    if i < snp1len and snp2len == 0:
+        b += snp1len
+    elif snp1len == 0 and j < snp2len:
+        c += snp2len
+    elif i < snp1len and snp2len != 0:
+        snp = snps2[j - 1]
+        while i < snp1len and abs(snp - snps1[i]) <= threshold:
+            a_val, b_val, c_val = computeMatch(snps1[i], snp, threshold)
+            a += a_val
+            b += b_val
+            c += c_val
+            i += 1
+        b += snp1len - i
+    elif j < snp2len and snp1len != 0:
+        snp = snps1[i - 1]
+        while j < snp2len and abs(snp - snps2[j]) <= threshold:
+            a_val, b_val, c_val = computeMatch(snps2[j], snp, threshold)
+            a += a_val
+            b += b_val
+            c += c_val
+            j += 1
+        c += snp2len - j
+    return a, b, c, -1
+
+
+def getFilteredTrack(random, snpCount, filterThreshold):
+    snps = np.sort(random.randint(0, CHROMOSOME_LENGTH, snpCount))
+    return np.asarray(FilterSNPStatUnsplittable.filterTrack(snps, random.rand(snpCount), filterThreshold))
+
+
+def timeCall(function, repeats):
+    start = time.time()
+    for _ in range(repeats):
+        result = function()
+    return result, (time.time() - start) / repeats
+
+
+def main():
+    snpCount = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    random = np.random.RandomState(0)
+
+    print 'Stat\tGenetic loci\tLoci 1\tLoci 2\tOriginal (s)\tVectorized (s)\tSpeedup\tEqual'
+    for geneticLocus in GENETIC_LOCI:
+        snps1 = getFilteredTrack(random, snpCount, geneticLocus)
+        snps2 = getFilteredTrack(random, snpCount, geneticLocus)
+        threshold = geneticLocus // 2
+
+        for name, stat, computeMatch in [('Block', DistanceMetricsBlockFoundationStatUnsplittable, blockMatch),
+                                         ('Fuzzy', DistanceMetricsFuzzyFoundationStatUnsplittable, fuzzyMatch)]:
+            original, originalTime = timeCall(
+                lambda: referenceCountMatches(snps1, snps2, threshold, computeMatch), repeats
+            )
+            vectorized, vectorizedTime = timeCall(lambda: stat.countMatches(snps1, snps2, threshold), repeats)
+            print '%s\t%i\t%i\t%i\t%.4f\t%.4f\t%.2f\t%s' % (
+                name, geneticLocus, len(snps1), len(snps2), originalTime, vectorizedTime,
+                originalTime / vectorizedTime, tuple(original) == tuple(vectorized)
+            )
+
+
+if __name__ == '__main__':
+    main()
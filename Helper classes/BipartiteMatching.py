@@ -1,6 +1,3 @@
-from quick.webtools.clustering.LDExpansions import LDExpansions
-
-
 class BipartiteMatching(object):
     """
     Functions for bipartite matching of tracks. The cost matrix, is a len(track1) x len(track2) matrix, where the
@@ -17,7 +14,7 @@ class BipartiteMatching(object):
     in each track is added to b and c.
 
     The greedy algorithm is susceptible to local optima, and cannot guarantee that the overall score is the maximal
-    score possible.
+    score possible. The optimal algorithm solves the matching as a linear assignment problem, see LinearAssignment.
 
     One can use generateCostMatrix and the functions in LDExpansions.py to generate a cost matrix based on a linked
     point track. In LDExpansions, a graph is created from a linked point track, and the function assume that
@@ -27,64 +24,72 @@ class BipartiteMatching(object):
     For example usage, see the LDBipartiteMatchingTool.
     """
 
+    # Part of the keys of the counts stored in the PairResultStore. To be increased whenever the counts found by the
+    # matchers, or the weights of the cost matrices, change, so that counts from earlier versions are not reused.
+    MATCHING_VERSION = '2'
+
     @classmethod
     def greedyBipartite(cls, cost_matrix):
         """
         Greedy algorithm for bipartite matching of two tracks.
-        Takes in a len(track1) x len(track2) matrix, where the cells are weights between the nodes in
-        the tracks.
+        Takes in a len(track1) x len(track2) matrix, dense or sparse, where the cells are weights between the nodes
+        in the tracks.
 
         Finds a, b and c for the tracks, as defined above.
+
+        The cell with the highest weight is matched first, along with its row and column, and then the cell with
+        the highest weight among the rows and columns not yet matched, and so on. Only cells with a weight are
+        visited, in order of decreasing weight, with ties in order of row and then column, i.e. the order in which
+        argmax finds them in the matrix.
         """
-        from numpy import zeros, shape, max, argmax, unravel_index, matrix
+        import numpy as np
+        from scipy.sparse import coo_matrix
 
-        dimensions = shape(cost_matrix)
         cost = {'a': 0.0, 'b': 0.0, 'c': 0.0, 'd': -1}
 
         cost['b'] += cls.getZeroOccurrences(cost_matrix)
-        cost['c'] += cls.getZeroOccurrences(matrix.transpose(cost_matrix))
-
-        while max(cost_matrix) > 0:
-            pos = argmax(cost_matrix)
-            row, col = unravel_index([pos], dimensions)
-            dimensions = list(dimensions)
-
-            val = max(cost_matrix)
-            cost_matrix[row[0], :] = zeros(dimensions[1])
-            cost_matrix[:, col[0]] = zeros(dimensions[0])
-            cost['a'] += val
+        cost['c'] += cls.getZeroOccurrences(cost_matrix.T)
+
+        cells = coo_matrix(cost_matrix)
+        isPositive = cells.data > 0
+        rows = cells.row[isPositive]
+        cols = cells.col[isPositive]
+        weights = cells.data[isPositive]
+        order = np.lexsort((cols, rows, -weights))
+
+        matchedRows = np.zeros(cells.shape[0], dtype=bool)
+        matchedCols = np.zeros(cells.shape[1], dtype=bool)
+        for row, col, weight in zip(rows[order].tolist(), cols[order].tolist(), weights[order].tolist()):
+            if not matchedRows[row] and not matchedCols[col]:
+                matchedRows[row] = True
+                matchedCols[col] = True
+                cost['a'] += weight
 
         return cost
 
     @classmethod
-    def lapjvBipartite(cls, cost_matrix):
+    def lapjvBipartite(cls, cost_matrix, backend=None):
         """
         Optimal algorithm for bipartite matching of two tracks.
-        Takes in len(track1) x len(track2) matrix, where the cells are weights between the nodes in
+        Takes in len(track1) x len(track2) matrix, dense or sparse, where the cells are weights between the nodes in
         the tracks.
 
-        Finds a, b and c for the tracks, as defined above.
+        Finds a, b and c for the tracks, as defined above. The matching with the highest total weight is found by
+        LinearAssignment.findMaximumMatching, with the given backend (LinearAssignment.SCIPY or
+        LinearAssignment.NUMPY), or the default backend if none is given.
         """
-        from quick.webtools.clustering.JonkerVolgenant import JonkerVolgenant
-        from numpy import matrix
-        matches = JonkerVolgenant.findJonkerVolgenant(cost_matrix)
+        from quick.webtools.clustering.LinearAssignment import LinearAssignment
+        from scipy.sparse import csr_matrix
 
         cost = {'a': 0, 'b': 0, 'c': 0, 'd': -1}
 
-        track1Length = len(cost_matrix)
-        track2Length = len(cost_matrix[0])
-
         cost['b'] += cls.getZeroOccurrences(cost_matrix)
-        cost['c'] += cls.getZeroOccurrences(matrix.transpose(cost_matrix))
+        cost['c'] += cls.getZeroOccurrences(cost_matrix.T)
 
-        if track1Length < track2Length:
-            for matchID in range(0, track1Length):
-                val = cost_matrix[matchID, matches[matchID]]
-                cost['a'] += val
-        else:
-            for matchID in range(0, track2Length):
-                val = cost_matrix[matches[matchID], matchID]
-                cost['a'] += val
+        cost_matrix = csr_matrix(cost_matrix)
+        rows, cols = LinearAssignment.findMaximumMatching(cost_matrix, backend)
+        if len(rows) > 0:
+            cost['a'] += cost_matrix[rows, cols].sum()
 
         return cost
 
@@ -95,32 +100,79 @@ class BipartiteMatching(object):
         represented as lists of the track SNP rsids.
         Return a cost matrix for the two tracks, where cells of value mark edges with specific weights between
         the nodes. Weights are rsquare values that weights edges between nodes (SNPs).
+
+        Returns the dense version of generateSparseCostMatrix.
         """
-        from numpy import zeros
+        return cls.generateSparseCostMatrix(track1, track2, graph).toarray()
 
-        dim1 = len(track1)
-        dim2 = len(track2)
+    @classmethod
+    def generateSparseCostMatrix(cls, track1, track2, graph):
+        """
+        As generateCostMatrix, but returns a sparse matrix (scipy.sparse.csr_matrix), holding only the cells with an
+        edge between the nodes, along with the cells of identical rsids, which have a weight of 1.
+
+        The rsids of both tracks are mapped to node ids in the graph, and the neighbours of the nodes of track1 are
+        looked up in the nodes of track2, rather than looking up every pair of SNPs.
+        """
+        import numpy as np
+        from scipy.sparse import csr_matrix
+
+        nodeIds1 = graph.getNodeIds(track1)
+        nodeIds2 = graph.getNodeIds(track2)
+        indptr, neighbourIds, r2 = graph.getNeighbourArrays()
+
+        # Neighbours in the graph of each SNP of track1, found among the SNPs of track2
+        rows = np.flatnonzero(nodeIds1 >= 0)
+        starts = indptr[nodeIds1[rows]]
+        neighbourCounts = indptr[nodeIds1[rows] + 1] - starts
+        edgeIndexes = np.repeat(starts - np.cumsum(neighbourCounts) + neighbourCounts, neighbourCounts) + \
+            np.arange(neighbourCounts.sum())
+        matches, edgeCols = cls._findInTrack(np.asarray(neighbourIds[edgeIndexes], dtype=np.int64), nodeIds2)
+        edgeRows = np.repeat(rows, neighbourCounts)[matches]
+        edgeWeights = graph.getWeights(r2[edgeIndexes[matches]]).astype(np.float64)
+
+        # Identical rsids, whether in the graph or not
+        _, codes = np.unique(np.concatenate([np.array(track1, dtype=str), np.array(track2, dtype=str)]),
+                             return_inverse=True)
+        sameRows, sameCols = cls._findInTrack(codes[:len(track1)], codes[len(track1):])
+
+        return csr_matrix(
+            (np.concatenate([edgeWeights, np.ones(len(sameRows))]),
+             (np.concatenate([edgeRows, sameRows]), np.concatenate([edgeCols, sameCols]))),
+            shape=(len(track1), len(track2))
+        )
+
+    @classmethod
+    def _findInTrack(cls, values, trackValues):
+        """
+        Finds all pairs (index in values, index in trackValues) with the same value, where negative values, i.e.
+        rsids not in the graph, never match.
+        """
+        import numpy as np
 
-        cost_matrix = zeros((dim1, dim2))
-        i, j = (0, 0)
-        while i < dim1:
-            while j < dim2:
-                r2 = LDExpansions.getEdge(track1[i], track2[j], graph)
-                cost_matrix[i, j] = r2
-                j += 1
-            i += 1
-            j = 0
+        order = np.argsort(trackValues, kind='mergesort')
+        sortedValues = trackValues[order]
+        starts = np.searchsorted(sortedValues, values, side='left')
+        counts = np.searchsorted(sortedValues, values, side='right') - starts
+        counts[values < 0] = 0
 
-        return cost_matrix
+        valueIndexes = np.repeat(np.arange(len(values)), counts)
+        sortedIndexes = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return valueIndexes, order[sortedIndexes]
 
     @classmethod
     def getZeroOccurrences(cls, matrix):
         """
-        Takes in cost matrix, and returns the number of rows with only zeros in them.
+        Takes in cost matrix, dense or sparse, and returns the number of rows with only zeros in them.
         """
-        zeroCount = 0
-        for row in matrix:
-            if all([x == 0 for x in row]):
-                zeroCount += 1
+        import numpy as np
+        from scipy.sparse import issparse
+
+        if issparse(matrix):
+            matrix = matrix.tocsr()
+            rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+            nonZeroCounts = np.bincount(rows[matrix.data != 0], minlength=matrix.shape[0])
+        else:
+            nonZeroCounts = np.count_nonzero(np.asarray(matrix), axis=1)
 
-        return zeroCount
+        return int(np.sum(nonZeroCounts == 0))
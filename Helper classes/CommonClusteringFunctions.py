@@ -3,6 +3,7 @@ from quick.multitrack.MultiTrackCommon import getGSuiteFromGalaxyTN
 from quick.util.StaticFile import GalaxyRunSpecificFile
 from quick.webtools.GeneralGuiTool import GeneralGuiTool
 from quick.webtools.clustering.MatplotlibPlots import MatplotlibPlots
+from quick.webtools.clustering.PairExecutor import PairExecutor
 from quick.webtools.mixin.DebugMixin import DebugMixin
 
 
@@ -71,7 +72,8 @@ class CommonClusteringFunctions(GeneralGuiTool):
             ('Select GSuite from history', 'gSuite'),
             ('Select distance measure', 'distanceMeasure'),
             ('Select distance measure', 'distanceCorrMeasure'),
-            ('Select linkage criterion', 'linkageCriterion')
+            ('Select linkage criterion', 'linkageCriterion'),
+            ('Number of parallel workers', 'workerCount')
         ] + DebugMixin.getInputBoxNamesForDebug()
 
     @staticmethod
@@ -102,6 +104,14 @@ class CommonClusteringFunctions(GeneralGuiTool):
                    CommonClusteringFunctions.ALL_MEASURES,
                ] + CommonClusteringFunctions.CORR_DISTLIST
 
+    @staticmethod
+    def getOptionsBoxWorkerCount(prevChoices):
+        return str(PairExecutor.DEFAULT_WORKER_COUNT)
+
+    @staticmethod
+    def getInfoForOptionsBoxWorkerCount(prevChoices):
+        return 'Number of processes that compare pairs of tracks in parallel. With 1, all pairs are compared in ' \
+               'one process.'
 
     @classmethod
     def printClusterPlots(cls, correlationMatrix, linkageMatrix, galaxyFn, distanceMeasure, labels, htmlCore):
@@ -113,51 +123,188 @@ class CommonClusteringFunctions(GeneralGuiTool):
         dendrogramFile = GalaxyRunSpecificFile(['Image', distanceMeasure + 'dendrogram.pdf'], galaxyFn)
 
         if minVal < 0 or isnan(minVal):
-            MatplotlibPlots.seabornHeatmapPlot(
-                correlationMatrix,
-                labels,
+            heatmapOptions = dict(
                 max=maxVal if maxVal >= 1 else 1,
                 min=minVal if minVal <= -1 else -1,
-                fileName=seabornFile,
                 cmap="RdBu_r"
             )
         else:
-            MatplotlibPlots.seabornHeatmapPlot(
-                correlationMatrix,
-                labels,
+            heatmapOptions = dict(
                 max=maxVal if maxVal >= 1 else 1,
-                min=minVal if minVal <= 0 else 0,
-                fileName=seabornFile
+                min=minVal if minVal <= 0 else 0
             )
 
-        MatplotlibPlots.dendrogramClusteringPlot(linkageMatrix, labels, dendrogramFile)
-        htmlCore.line(seabornFile.getEmbeddedImage())
-        htmlCore.link('PDF of similarity matrix', seabornFile.getURL())
-        htmlCore.line(dendrogramFile.getEmbeddedImage())
-        htmlCore.link('PDF of dendrogram', dendrogramFile.getURL())
+        if len(labels) > MatplotlibPlots.LARGE_HEATMAP_SIZE:
+            cls.printLargeHeatmap(correlationMatrix, linkageMatrix, galaxyFn, distanceMeasure, labels, htmlCore,
+                                  heatmapOptions)
+        else:
+            MatplotlibPlots.seabornHeatmapPlot(correlationMatrix, labels, fileName=seabornFile, **heatmapOptions)
+            htmlCore.line(seabornFile.getEmbeddedImage())
+            htmlCore.link('PDF of similarity matrix', seabornFile.getURL())
+
+        if len(labels) > MatplotlibPlots.LARGE_DENDROGRAM_SIZE:
+            MatplotlibPlots.dendrogramClusteringPlot(linkageMatrix, labels, dendrogramFile, truncateMode='lastp',
+                                                     p=MatplotlibPlots.TRUNCATED_DENDROGRAM_LEAVES)
+            htmlCore.line(dendrogramFile.getEmbeddedImage())
+            htmlCore.link('PDF of dendrogram, truncated to the last %i clusters'
+                          % MatplotlibPlots.TRUNCATED_DENDROGRAM_LEAVES, dendrogramFile.getURL())
+        else:
+            MatplotlibPlots.dendrogramClusteringPlot(linkageMatrix, labels, dendrogramFile)
+            htmlCore.line(dendrogramFile.getEmbeddedImage())
+            htmlCore.link('PDF of dendrogram', dendrogramFile.getURL())
+
+        treeFile = GalaxyRunSpecificFile([distanceMeasure + 'dendrogram.json'], galaxyFn)
+        cls._writeTreeJson(treeFile.getDiskPath(True), linkageMatrix, labels)
+        htmlCore.link('<br>Full clustering tree (JSON)', treeFile.getURL())
 
     @classmethod
-    def printTextMatrixes(cls, correlationMatrix, linkageMatrix, distanceMatrix, galaxyFn, filename, htmlCore):
+    def _writeTreeJson(cls, fileName, linkageMatrix, labels):
+        """
+        Writes the full clustering tree as JSON, for viewers that load the tree on demand. The file holds the
+        labels, the merges of the linkage matrix as [left, right, distance, size], where nodes from 0 to n - 1 are
+        the tracks and node n + i is created by merge i, and the tree in Newick format, with branch lengths.
+        The tree is built without recursion, so that deep trees (as from single linkage) are supported.
+        """
+        import json
+
+        size = len(labels)
+        heights = [0.0] * size
+        newick = ["'" + str(label).replace("'", "''") + "'" for label in labels]
+        merges = []
+        for left, right, distance, count in linkageMatrix:
+            left, right, distance = int(left), int(right), float(distance)
+            newick.append('(%s:%r,%s:%r)' % (newick[left], distance - heights[left],
+                                             newick[right], distance - heights[right]))
+            heights.append(distance)
+            newick[left] = newick[right] = None
+            merges.append([left, right, distance, int(count)])
+
+        with open(fileName, 'w') as outFile:
+            json.dump({'labels': list(labels), 'merges': merges, 'newick': newick[-1] + ';'}, outFile,
+                      separators=(',', ':'))
+
+    @classmethod
+    def printLargeHeatmap(cls, correlationMatrix, linkageMatrix, galaxyFn, distanceMeasure, labels, htmlCore,
+                          heatmapOptions):
+        """
+        Heatmap for large GSuites. The rows and columns are ordered by the leaves of the dendrogram, so that clusters
+        appear as blocks along the diagonal, and the cells are rasterized. For the largest GSuites, the heatmap is
+        block averaged into an overview of constant size, and the full resolution is given in tiles along the
+        diagonal.
+        """
+        order = MatplotlibPlots.getLeafOrder(linkageMatrix)
+        orderedMatrix = correlationMatrix[order][:, order]
+        orderedLabels = [labels[i] for i in order]
+        size = len(orderedLabels)
+
+        heatmapFile = GalaxyRunSpecificFile(['Image', distanceMeasure + 'heatmap.pdf'], galaxyFn)
+        if size <= MatplotlibPlots.OVERVIEW_SIZE:
+            MatplotlibPlots.rasterHeatmapPlot(orderedMatrix, orderedLabels, heatmapFile, **heatmapOptions)
+            htmlCore.line(heatmapFile.getEmbeddedImage())
+            htmlCore.link('PDF of similarity matrix, ordered by the dendrogram', heatmapFile.getURL())
+            return
+
+        blockSize = (size + MatplotlibPlots.OVERVIEW_SIZE - 1) // MatplotlibPlots.OVERVIEW_SIZE
+        MatplotlibPlots.rasterHeatmapPlot(
+            MatplotlibPlots.blockAverage(orderedMatrix, blockSize),
+            None,
+            heatmapFile,
+            title='Mean of blocks of %i x %i tracks, ordered by the dendrogram' % (blockSize, blockSize),
+            **heatmapOptions
+        )
+        htmlCore.line(heatmapFile.getEmbeddedImage())
+        htmlCore.link('PDF of block averaged similarity matrix', heatmapFile.getURL())
+
+        htmlCore.line('<br>Tiles of the similarity matrix along the diagonal, in full resolution:')
+        for start, end in MatplotlibPlots.getDiagonalTiles(size, MatplotlibPlots.TILE_SIZE):
+            tileFile = GalaxyRunSpecificFile(
+                ['Image', distanceMeasure + 'heatmap_%i-%i.pdf' % (start + 1, end)], galaxyFn
+            )
+            MatplotlibPlots.rasterHeatmapPlot(orderedMatrix[start:end, start:end], orderedLabels[start:end],
+                                              tileFile, **heatmapOptions)
+            htmlCore.link('Tracks %i-%i' % (start + 1, end), tileFile.getURL())
+
+    @classmethod
+    def printTextMatrixes(cls, correlationMatrix, linkageMatrix, distanceMatrix, galaxyFn, filename, htmlCore,
+                          labels=None):
+        """
+        Writes the square similarity/correlation matrix, the triangular (condensed) distance matrix and the linkage
+        matrix as tab separated text files with full precision, written one row at a time. The matrices are also
+        written as NumPy .npy files, which can be memory-mapped with numpy.load(fileName, mmap_mode='r'), along with
+        a .npz file holding all three matrices and the labels.
+        """
+        from itertools import izip
+
+        import numpy as np
+
+        correlationMatrix = np.asarray(correlationMatrix, dtype=np.float64)
+        distanceMatrix = np.asarray(distanceMatrix, dtype=np.float64)
+        linkageMatrix = np.asarray(linkageMatrix, dtype=np.float64)
 
         # Print correlation matrix
-        corrMatrixFile = GalaxyRunSpecificFile(['corr_matrix_result_' + filename + '.txt'], galaxyFn)
-        corrMatrixPath = corrMatrixFile.getDiskPath(True)
-        open(corrMatrixPath, 'w').write(str(correlationMatrix))
+        corrMatrixFile = GalaxyRunSpecificFile(['corr_matrix_result_' + filename + '.tsv'], galaxyFn)
+        cls._writeTsvMatrix(corrMatrixFile.getDiskPath(True), correlationMatrix, labels, labels)
         htmlCore.link('<br><br>View the raw text similarity/correlation matrix for this analysis',
                       corrMatrixFile.getURL())
 
-        # Print distance matrix
-        distMatrixFile = GalaxyRunSpecificFile(['dist_matrix_result_' + filename + '.txt'], galaxyFn)
-        distMatrixPath = distMatrixFile.getDiskPath(True)
-        open(distMatrixPath, 'w').write(str(distanceMatrix))
+        # Print distance matrix, with one row for each pair of tracks. The labels of the pairs are made as the rows
+        # are written, as there are N(N-1)/2 of them.
+        distMatrixFile = GalaxyRunSpecificFile(['dist_matrix_result_' + filename + '.tsv'], galaxyFn)
+        pairLabels = None
+        if labels is not None:
+            rows, cols = np.triu_indices(len(correlationMatrix), 1)
+            pairLabels = (labels[i] + '\t' + labels[j] for i, j in izip(rows, cols))
+        cls._writeTsvMatrix(distMatrixFile.getDiskPath(True), distanceMatrix.reshape(-1, 1), pairLabels)
         htmlCore.link('<br><br>View the raw text triangular distance matrix for this analysis', distMatrixFile.getURL())
 
         # Print linkage matrix
-        linkMatrixFile = GalaxyRunSpecificFile(['linkage_matrix_result_' + filename + '.txt'], galaxyFn)
-        linkMatrixPath = linkMatrixFile.getDiskPath(True)
-        open(linkMatrixPath, 'w').write(str(linkageMatrix))
+        linkMatrixFile = GalaxyRunSpecificFile(['linkage_matrix_result_' + filename + '.tsv'], galaxyFn)
+        cls._writeTsvMatrix(linkMatrixFile.getDiskPath(True), linkageMatrix)
         htmlCore.link('<br><br>View the raw text linkage matrix for this analysis', linkMatrixFile.getURL())
 
+        # Binary matrices
+        matrices = [
+            ('corr_matrix_result_', correlationMatrix),
+            ('dist_matrix_result_', distanceMatrix),
+            ('linkage_matrix_result_', linkageMatrix)
+        ]
+        binaryLinks = []
+        for prefix, matrix in matrices:
+            npyFile = GalaxyRunSpecificFile([prefix + filename + '.npy'], galaxyFn)
+            np.save(npyFile.getDiskPath(True), matrix)
+            binaryLinks.append(npyFile.getLink(prefix + filename + '.npy'))
+
+        npzFile = GalaxyRunSpecificFile(['matrices_result_' + filename + '.npz'], galaxyFn)
+        np.savez(
+            npzFile.getDiskPath(True),
+            square=correlationMatrix,
+            condensed=distanceMatrix,
+            linkage=linkageMatrix,
+            labels=np.array(labels if labels is not None else [])
+        )
+        binaryLinks.append(npzFile.getLink('matrices_result_' + filename + '.npz'))
+        htmlCore.line('<br><br>NumPy files of the matrices for this analysis: ' + ', '.join(binaryLinks))
+
+    @classmethod
+    def _writeTsvMatrix(cls, fileName, matrix, rowLabels=None, colLabels=None):
+        """
+        Writes a two-dimensional matrix as tab separated values, one row at a time, with the shortest representation
+        of each float that reads back to the same value. The row labels can be any iterable, e.g. a generator, with one
+        label for each row.
+        """
+        if rowLabels is not None:
+            rowLabels = iter(rowLabels)
+
+        with open(fileName, 'w') as outFile:
+            if colLabels is not None:
+                outFile.write('\t' + '\t'.join(colLabels) + '\n')
+
+            for row in matrix:
+                values = '\t'.join([repr(float(value)) for value in row])
+                if rowLabels is not None:
+                    values = next(rowLabels) + '\t' + values
+                outFile.write(values + '\n')
+
     @classmethod
     def validateGSuite(cls, choices):
         errorString = cls._checkGSuiteFile(choices.gSuite)
@@ -250,6 +397,249 @@ class CommonClusteringFunctions(GeneralGuiTool):
         similarity = nominator / denominator if denominator != 0 else 0
         return 1 - cls.roundFloat(similarity)
 
+    @classmethod
+    def getDistances(cls, a, b, c, d, measures):
+        """
+        Vectorized version of getDistance, computing the distances of all track pairs at once.
+        Takes in arrays of a, b, c and d, where each element is the count of one pair, and returns a dictionary with
+        a distance vector for each of the given measures. The vectors have the same (condensed) order as the counts.
+
+        Pearson is not defined when a track has no features, and nan is returned for these pairs, in stead of failing.
+        """
+        import numpy as np
+
+        a = np.asarray(a, dtype=float)
+        b = np.asarray(b, dtype=float)
+        c = np.asarray(c, dtype=float)
+        d = np.asarray(d, dtype=float)
+
+        distances = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for measure in measures:
+                distances[measure] = cls._getDistanceVector(a, b, c, d, measure)
+
+        return distances
+
+    @classmethod
+    def _getDistanceVector(cls, a, b, c, d, similarityMetric):
+        import numpy as np
+
+        if similarityMetric == CommonClusteringFunctions.SIM_JACCARD:
+            denominator = a + b + c
+            nominator = a
+        elif similarityMetric == CommonClusteringFunctions.SIM_COSINE:
+            denominator = np.sqrt(a + b) * np.sqrt(a + c)
+            nominator = a
+        elif similarityMetric == CommonClusteringFunctions.SIM_SIMPSON:
+            denominator = np.minimum(a + b, a + c)
+            nominator = a
+        elif similarityMetric == CommonClusteringFunctions.SIM_OTSUKA:
+            denominator = np.sqrt((a + b) * (a + c))
+            nominator = a
+        elif similarityMetric == CommonClusteringFunctions.SIM_SORGENFREI:
+            nominator = a ** 2
+            denominator = (a + b) * (a + c)
+        elif similarityMetric == CommonClusteringFunctions.SIM_KULCZYNSKI:
+            nominator = (a / 2) * (2 * a + b + c)
+            denominator = (a + b) * (a + c)
+        elif similarityMetric == CommonClusteringFunctions.SIM_FORBES:
+            n = a + b + c + d
+            denominator = (a + c) * (a + b)
+            forbes = n * a / denominator
+            logForbes = np.log(forbes) + 1
+            distance = 1 / np.where(logForbes > 1, logForbes, 1)
+            return np.where((denominator > 0) & (forbes != 0), distance, 1.0)
+
+        elif similarityMetric == CommonClusteringFunctions.SIM_MCCONNAUGHEY:
+            nominator = (a ** 2) - (b * c)
+            denominator = (a + b) * (a + c)
+            return np.where(denominator != 0, nominator / denominator, 0.0)
+
+        elif similarityMetric == CommonClusteringFunctions.CORR_PEARSON:
+            nominator = (a * d) - (b * c)
+            denominator = np.sqrt((a + b) * (d + c) * (a + c) * (d + b))
+            return np.where(denominator != 0, nominator / denominator, np.nan)
+
+        else:
+            raise ValueError('Unknown distance measure: ' + str(similarityMetric))
+
+        similarity = np.where(denominator != 0, nominator / denominator, 0.0)
+        return 1 - np.trunc((similarity * 1000000) + 0.000001) / 1000000.0
+
+    @classmethod
+    def getMatchCounts(cls, intersections, sizes, featureCount):
+        """
+        Takes in a square matrix with the count of positive matches between each pair of tracks, the number of
+        features present in each track, and the total number of features.
+        Returns arrays of a, b, c and d for all pairs of tracks, in the order of the triangular distance matrix.
+        """
+        import numpy as np
+
+        rows, cols = np.triu_indices(len(sizes), 1)
+        a = intersections[rows, cols]
+        b = sizes[rows] - a
+        c = sizes[cols] - a
+        d = featureCount - a - b - c
+        return a, b, c, d
+
+    @classmethod
+    def getIndexMatchCounts(cls, indexArrays, featureCount):
+        """
+        Takes in a list of arrays with the indexes of the features present in each track, and returns arrays of
+        a, b, c and d for all pairs of tracks.
+
+        The indexes are stored in a sparse track x feature incidence matrix, and the positive matches are found by the
+        product of the matrix with its transpose.
+        """
+        import numpy as np
+        from scipy.sparse import csr_matrix
+
+        indexArrays = [np.unique(indexes) for indexes in indexArrays]
+        sizes = np.array([len(indexes) for indexes in indexArrays], dtype=np.int64)
+
+        rows = np.repeat(np.arange(len(indexArrays)), sizes)
+        columns = np.concatenate(indexArrays)
+        incidence = csr_matrix(
+            (np.ones(len(columns), dtype=np.int64), (rows, columns)),
+            shape=(len(indexArrays), featureCount)
+        )
+
+        intersections = incidence.dot(incidence.T).toarray()
+        return cls.getMatchCounts(intersections, sizes, featureCount)
+
+    @classmethod
+    def getOccupancyMatchCounts(cls, occupancy, chunkSize=32768):
+        """
+        Takes in a boolean matrix with one row for each track and one column for each feature, and returns arrays of
+        a, b, c and d for all pairs of tracks.
+
+        The positive matches are found by the matrix product of the occupancy matrix with its transpose. The product
+        is computed for a chunk of features at a time, so that only a chunk is converted into floating points.
+        """
+        import numpy as np
+
+        trackCount, featureCount = occupancy.shape
+        intersections = np.zeros((trackCount, trackCount), dtype=np.int64)
+        for start in range(0, featureCount, chunkSize):
+            chunk = occupancy[:, start:start + chunkSize].astype(np.float32)
+            intersections += chunk.dot(chunk.T).astype(np.int64)
+
+        sizes = occupancy.sum(axis=1).astype(np.int64)
+        return cls.getMatchCounts(intersections, sizes, featureCount)
+
+    @classmethod
+    def packOccupancy(cls, occupancy):
+        """
+        Packs a boolean occupancy vector into a bitset of uint64 words, using one bit per feature.
+        The last word is padded with zeros, which do not count as features.
+        """
+        import numpy as np
+
+        packed = np.packbits(np.asarray(occupancy, dtype=bool))
+        padding = -len(packed) % 8
+        if padding:
+            packed = np.concatenate([packed, np.zeros(padding, dtype=np.uint8)])
+        return packed.view(np.uint64)
+
+    @classmethod
+    def getPackedMatchCounts(cls, packedOccupancies, featureCount, chunkBytes=2 ** 26):
+        """
+        Same as getOccupancyMatchCounts, but takes in a list of bitsets as created by packOccupancy.
+        Positive matches are counted with bitwise AND and a popcount of the resulting words, for one track against
+        a chunk of the following tracks at a time.
+        """
+        import numpy as np
+
+        popcount = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+        packed = np.vstack(packedOccupancies)
+        trackCount, wordCount = packed.shape
+        rowChunk = max(1, chunkBytes // max(1, wordCount * 8))
+
+        sizes = popcount[packed.view(np.uint8)].sum(axis=1).astype(np.int64)
+        intersections = np.zeros((trackCount, trackCount), dtype=np.int64)
+        for i in range(0, trackCount):
+            for start in range(i + 1, trackCount, rowChunk):
+                overlap = packed[start:start + rowChunk] & packed[i]
+                intersections[i, start:start + rowChunk] = popcount[overlap.view(np.uint8)].sum(axis=1)
+
+        return cls.getMatchCounts(intersections, sizes, featureCount)
+
+    @classmethod
+    def getTrackHashes(cls, tracks, analysisBins):
+        """
+        Content hash of each track, used to identify the tracks in the PairResultStore. The hashes are computed from
+        the TrackSnapshot of each track, so the tracks are only read the first time they are used.
+        """
+        from quick.webtools.clustering.TrackSnapshot import TrackSnapshot
+
+        return [TrackSnapshot.getTrackHash(trackArrays)
+                for trackArrays in TrackSnapshot.getTrackArrays(tracks, analysisBins)]
+
+    @classmethod
+    def getTrackSizes(cls, tracks, analysisBins):
+        """Number of track elements of each track, used to estimate the cost of comparing pairs of tracks."""
+        from quick.webtools.clustering.TrackSnapshot import TrackSnapshot
+
+        return [TrackSnapshot.getTrackSize(trackArrays)
+                for trackArrays in TrackSnapshot.getTrackArrays(tracks, analysisBins)]
+
+    @classmethod
+    def getPairCounts(cls, hashes, statKey, computeCounts):
+        """
+        Returns the list of match dictionaries for all pairs of tracks, in the order of the triangular distance matrix,
+        using the counts stored in the PairResultStore where possible.
+
+        Takes in the content hash of each track, the key of the statistic and its parameters, and a function that
+        computes the counts of a list of (i, j) index pairs, returning a list of match dictionaries in the same order.
+        The function is only called for pairs of tracks not stored from an earlier run, and only once for tracks with
+        identical content.
+        """
+        from quick.webtools.clustering.PairResultStore import PairResultStore
+
+        hashPairs = []
+        indexPairs = {}
+        for i in range(len(hashes)):
+            for j in range(i + 1, len(hashes)):
+                hashPair = (hashes[i], hashes[j])
+                hashPairs.append(hashPair)
+                indexPairs.setdefault(hashPair, (i, j))
+
+        store = PairResultStore(statKey)
+        try:
+            storedCounts = store.getCounts(hashPairs)
+            missingPairs = [hashPair for hashPair in indexPairs if hashPair not in storedCounts]
+            if missingPairs:
+                newCounts = computeCounts([indexPairs[hashPair] for hashPair in missingPairs])
+                newCounts = dict(zip(missingPairs, newCounts))
+                store.addCounts(newCounts)
+                storedCounts.update(newCounts)
+        finally:
+            store.close()
+
+        return [storedCounts[hashPair] for hashPair in hashPairs]
+
+    @classmethod
+    def selectPairCounts(cls, a, b, c, d, indexPairs, trackCount):
+        """
+        Takes in arrays of a, b, c and d for all pairs of tracks, in the order of the triangular distance matrix, and
+        returns the list of match dictionaries of the given (i, j) index pairs, i < j.
+        Used by tools that compute all pairs at once, to pass the counts to getPairCounts.
+        """
+        counts = []
+        for i, j in indexPairs:
+            index = trackCount * i - i * (i + 1) // 2 + j - i - 1
+            counts.append({'a': a[index], 'b': b[index], 'c': c[index], 'd': d[index]})
+
+        return counts
+
+    @classmethod
+    def getSelectedMeasures(cls, distanceMeasure, measureList):
+        """Only the chosen measure is computed, unless all measures in the list are to be compared."""
+        if distanceMeasure == cls.ALL_MEASURES:
+            return measureList
+        return [distanceMeasure]
+
     @classmethod
     def createDistDict(cls, allMeasures):
         """
@@ -273,6 +663,30 @@ class CommonClusteringFunctions(GeneralGuiTool):
             distance = cls.getDistance(matches, dist)
             distDict[dist].append(distance)
 
+    @classmethod
+    def setDistDict(cls, distDict, a, b, c, d):
+        """
+        Set all distance/correlation measures of the dictionary from arrays of a, b, c and d, holding the matches
+        of all pairs of tracks in the order of the triangular distance/correlation matrix.
+        """
+        distances = cls.getDistances(a, b, c, d, cls.getDistDictKeys(distDict))
+        for dist in cls.getDistDictKeys(distDict):
+            distDict[dist] = distances[dist]
+
+    @classmethod
+    def setDistDictFromCounts(cls, distDict, counts):
+        """
+        Same as setDistDict, but takes in the list of match dictionaries, one for each pair of tracks, as returned by
+        the statistics and bipartite matchers.
+        """
+        cls.setDistDict(
+            distDict,
+            [count['a'] for count in counts],
+            [count['b'] for count in counts],
+            [count['c'] for count in counts],
+            [count['d'] for count in counts]
+        )
+
     @classmethod
     def getDistDictKeys(cls, distDict):
         """Get the distance/correlation measures the dictionary contain."""
@@ -322,23 +736,32 @@ class CommonClusteringFunctions(GeneralGuiTool):
         return triangularDistanceMatrix
 
     @classmethod
-    def printDistPlots(cls, distDict, labels, distanceMeasure, linkageCriterion, galaxyFn, htmlCore):
+    def printDistPlots(cls, distDict, labels, distanceMeasure, linkageCriterion, galaxyFn, htmlCore, resultName=None):
+        """
+        If several distance dictionaries are printed in the same run, a unique resultName must be given for each,
+        so that the output files do not overwrite each other.
+        """
 
         if distanceMeasure == cls.ALL_MEASURES:
             for measure in cls.getDistDictKeys(distDict):
-                cls.printForOneDistanceMeasure(distDict, galaxyFn, htmlCore, labels, linkageCriterion, measure)
+                cls.printForOneDistanceMeasure(distDict, galaxyFn, htmlCore, labels, linkageCriterion, measure,
+                                               resultName)
         else:
-            cls.printForOneDistanceMeasure(distDict, galaxyFn, htmlCore, labels, linkageCriterion, distanceMeasure)
+            cls.printForOneDistanceMeasure(distDict, galaxyFn, htmlCore, labels, linkageCriterion, distanceMeasure,
+                                           resultName)
 
     @classmethod
-    def printForOneDistanceMeasure(cls, distDict, galaxyFn, htmlCore, labels, linkageCriterion, measure):
+    def printForOneDistanceMeasure(cls, distDict, galaxyFn, htmlCore, labels, linkageCriterion, measure,
+                                   resultName=None):
+        fileName = measure if resultName is None else resultName + '_' + measure
+
         htmlCore.divider(True)
         measureType = 'Correlation' if measure == cls.CORR_PEARSON else 'Similarity'
         htmlCore.smallHeader(measureType + ' matrix and clustering of distances with ' + measure)
         htmlCore.line('<br>')
         corr, linkage, distance = cls.getDistMatrixes(distDict, measure, linkageCriterion)
-        cls.printClusterPlots(corr, linkage, galaxyFn, measure, labels, htmlCore)
-        cls.printTextMatrixes(corr, linkage, distance, galaxyFn, measure, htmlCore)
+        cls.printClusterPlots(corr, linkage, galaxyFn, fileName, labels, htmlCore)
+        cls.printTextMatrixes(corr, linkage, distance, galaxyFn, fileName, htmlCore, labels)
         cls.findRanking(distance, labels, measure, htmlCore)
 
 
@@ -373,6 +796,14 @@ class CommonClusteringFunctions(GeneralGuiTool):
         if link == cls.DEFAULT_SELECT:
             return 'Please select a linkage criterion'
 
+    @classmethod
+    def checkWorkerCount(cls, workerCount):
+        try:
+            if int(workerCount) < 1:
+                return 'Please define number of parallel workers as a positive integer'
+        except ValueError:
+            return 'Please define number of parallel workers as a positive integer'
+
     @classmethod
     def findRanking(cls, triangularDistance, labels, measure, htmlCore):
         """
@@ -13,6 +13,13 @@ class CommonCorrelationFunctions(CommonClusteringFunctions):
     CORR_PEARSON = 'Pearson'
     CORR_SPEARMAN = 'Spearman'
 
+    # Relative size of the variance of a track below which it is regarded as constant, see _getCorrelationsFromSums
+    VARIANCE_TOLERANCE = 1e-10
+
+    # Number of values (positions x tracks) of a sparse value matrix made dense at a time, see
+    # getSparseMatrixCorrelations
+    MATRIX_CHUNK_VALUES = 2 ** 22
+
     @classmethod
     def getCommonCorrelationInputBoxes(cls):
         return [
@@ -31,20 +38,327 @@ class CommonCorrelationFunctions(CommonClusteringFunctions):
         ]
 
     @classmethod
-    def updateCorrDict(cls, corrDict, vector1, vector2):
-        """Similar to the updateDistDict of CommonClusteringFunctions"""
+    def getVectorCorrelations(cls, vector1, vector2, corrStats):
+        """
+        Takes in the overlapping values of a pair of tracks, and returns a dictionary with the coefficient for each
+        correlation coefficient in corrStats.
 
-        for corr in cls.getDistDictKeys(corrDict):
-            corrDict[corr].append(cls.getCorrelation(vector1, vector2, corr))
+        The sums needed for the Pearson coefficient are found as for a single group of _getGroupedCorrelations. For
+        Spearman, the values are ranked, and correlated in the same way. Gives NaN for pairs with less than two
+        values, with constant values, or with NaN values, as do scipy.stats.pearsonr and spearmanr.
+        """
+        import numpy as np
+
+        values1 = np.asarray(vector1, dtype=np.float64)
+        values2 = np.asarray(vector2, dtype=np.float64)
+        corrDict = cls._getGroupedCorrelationDict(values1, values2, np.zeros(len(values1), dtype=np.intp), 1,
+                                                  corrStats)
+        return dict((corr, correlations[0]) for corr, correlations in corrDict.items())
 
     @classmethod
-    def getCorrelation(cls, vector1, vector2, corrStat):
-        from scipy.stats import pearsonr, spearmanr
+    def getRowCorrelations(cls, vectors1, vectors2, mask, corrStats, ranks1=None, ranks2=None):
+        """
+        Correlation of each row of vectors1 with the same row of vectors2, where only the elements set in mask are
+        used. Returns a dictionary with a list of coefficients, one for each row, for each correlation coefficient in
+        corrStats.
+
+        For Spearman, ranks of the rows within mask can be given, for instance when these are found from ranks
+        computed once for each track. Otherwise, the rows are ranked here.
+        """
+        import numpy as np
+
+        corrDict = {}
+        if cls.CORR_PEARSON in corrStats:
+            corrDict[cls.CORR_PEARSON] = cls._getMaskedRowCorrelations(vectors1, vectors2, mask)
+
+        if cls.CORR_SPEARMAN in corrStats:
+            if ranks1 is None or ranks2 is None:
+                rowIds = np.nonzero(mask)[0]
+                ranks1 = np.zeros(mask.shape)
+                ranks2 = np.zeros(mask.shape)
+                ranks1[mask] = cls._getGroupedRanks(vectors1[mask], rowIds)
+                ranks2[mask] = cls._getGroupedRanks(vectors2[mask], rowIds)
+            corrDict[cls.CORR_SPEARMAN] = cls._getMaskedRowCorrelations(ranks1, ranks2, mask)
+
+        return corrDict
+
+    @classmethod
+    def _getMaskedRowCorrelations(cls, vectors1, vectors2, mask):
+        """
+        Pearson correlation of each row of vectors1 with the same row of vectors2, on the elements set in mask.
+        Returns a list with one coefficient for each row, or NaN where a row is constant.
+        """
+        import numpy as np
+
+        counts = mask.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            centered1 = np.where(mask, vectors1 - (np.where(mask, vectors1, 0).sum(axis=1) / counts)[:, np.newaxis], 0)
+            centered2 = np.where(mask, vectors2 - (np.where(mask, vectors2, 0).sum(axis=1) / counts)[:, np.newaxis], 0)
+            correlations = (centered1 * centered2).sum(axis=1) / \
+                np.sqrt((centered1 ** 2).sum(axis=1) * (centered2 ** 2).sum(axis=1))
+
+        return np.clip(correlations, -1.0, 1.0).tolist()
+
+    @classmethod
+    def _getGroupedCorrelationDict(cls, values1, values2, groupIds, groupCount, corrStats):
+        import numpy as np
+
+        corrDict = {}
+        if cls.CORR_PEARSON in corrStats:
+            corrDict[cls.CORR_PEARSON] = cls._getGroupedCorrelations(values1, values2, groupIds, groupCount)
+
+        if cls.CORR_SPEARMAN in corrStats:
+            correlations = cls._getGroupedCorrelations(
+                cls._getGroupedRanks(values1, groupIds), cls._getGroupedRanks(values2, groupIds), groupIds, groupCount
+            )
+            hasNan = np.bincount(groupIds, np.isnan(values1) | np.isnan(values2), minlength=groupCount) > 0
+            corrDict[cls.CORR_SPEARMAN] = np.where(hasNan, np.nan, correlations).tolist()
+
+        return corrDict
+
+    @classmethod
+    def _getGroupedCorrelations(cls, values1, values2, groupIds, groupCount):
+        """
+        Pearson correlation of values1 and values2 within each group, where groupIds holds the group of each value.
+        Returns a list with one coefficient for each group, or NaN where a group has constant values.
+        """
+        import numpy as np
+
+        counts = np.bincount(groupIds, minlength=groupCount)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            centered1 = values1 - (np.bincount(groupIds, values1, minlength=groupCount) / counts)[groupIds]
+            centered2 = values2 - (np.bincount(groupIds, values2, minlength=groupCount) / counts)[groupIds]
+            correlations = np.bincount(groupIds, centered1 * centered2, minlength=groupCount) / np.sqrt(
+                np.bincount(groupIds, centered1 ** 2, minlength=groupCount) *
+                np.bincount(groupIds, centered2 ** 2, minlength=groupCount)
+            )
+
+        return np.clip(correlations, -1.0, 1.0).tolist()
+
+    @classmethod
+    def _getGroupedRanks(cls, values, groupIds):
+        """
+        Ranks of the values within each group, where groupIds holds the group of each value. Tied values get the
+        average of their ranks, as in scipy.stats.rankdata.
+        """
+        import numpy as np
+
+        order = np.lexsort((values, groupIds))
+        sortedValues = values[order]
+        sortedIds = groupIds[order]
+
+        isNewGroup = np.concatenate(([True], sortedIds[1:] != sortedIds[:-1]))[:len(values)]
+        isNewRun = isNewGroup | np.concatenate(([True], sortedValues[1:] != sortedValues[:-1]))[:len(values)]
+        runStarts = np.flatnonzero(isNewRun)
+        runEnds = np.append(runStarts[1:], len(values))
+        groupStarts = np.flatnonzero(isNewGroup)
+
+        runIds = np.cumsum(isNewRun) - 1
+        groupIndexes = np.cumsum(isNewGroup) - 1
+        averageRanks = (runStarts + runEnds - 1) / 2.0
+
+        ranks = np.empty(len(values))
+        ranks[order] = averageRanks[runIds] - groupStarts[groupIndexes] + 1
+        return ranks
+
+    @classmethod
+    def _getCorrelationsFromSums(cls, counts, sums, squareSums, products):
+        """
+        Square matrix of Pearson correlations from the sums of the values of each pair of tracks (i, j), on the
+        positions present in both: counts, sums (of the values of track i), sums of squares (of track i) and sums of
+        products.
+        """
+        import numpy as np
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Rows that are constant on the overlap get a variance of rounding errors only, and a coefficient of NaN
+            covariances = products - sums * sums.T / counts
+            variances1 = squareSums - sums ** 2 / counts
+            variances1[variances1 <= cls.VARIANCE_TOLERANCE * squareSums] = 0
+            variances2 = variances1.T
+            correlations = np.where(variances1 * variances2 > 0, covariances / np.sqrt(variances1 * variances2), np.nan)
+
+        return np.clip(correlations, -1.0, 1.0)
+
+    @classmethod
+    def getValueCells(cls, positionsList, valuesList):
+        """
+        Takes in the positions and values of each track, and returns the unique positions of all tracks, in sorted
+        order, along with the row (index into the positions), column (index of the track) and value of each cell of
+        a sparse position x track value matrix.
+
+        Values of -log(pval) are assumed, so if a track has several SNPs at a position, the most significant value,
+        i.e. the highest, is kept. Infinite values and NaN are left out, as missing values.
+        """
+        import numpy as np
+
+        trackPositions = []
+        trackValues = []
+        for positions, values in zip(positionsList, valuesList):
+            positions, values = cls._getBestValues(np.asarray(positions), np.asarray(values, dtype=np.float64))
+            trackPositions.append(positions)
+            trackValues.append(values)
+
+        sizes = [len(positions) for positions in trackPositions]
+        allPositions, rows = np.unique(np.concatenate(trackPositions + [np.zeros(0, dtype=np.int64)]),
+                                       return_inverse=True)
+        cols = np.repeat(np.arange(len(sizes)), sizes)
+        return allPositions, rows, cols, np.concatenate(trackValues + [np.zeros(0)])
+
+    @classmethod
+    def _getBestValues(cls, positions, values):
+        """Unique positions of a track with a finite value, along with the highest value at each position."""
+        import numpy as np
+
+        isFinite = np.isfinite(values)
+        positions = positions[isFinite]
+        values = values[isFinite]
+        if len(positions) == 0:
+            return positions, values
+
+        order = np.argsort(positions, kind='mergesort')
+        positions = positions[order]
+        values = values[order]
+        uniquePositions, starts = np.unique(positions, return_index=True)
+        return uniquePositions, np.maximum.reduceat(values, starts)
+
+    @classmethod
+    def getSparseMatrixCorrelations(cls, valueMatrix, corrStats, chunkValues=MATRIX_CHUNK_VALUES):
+        """
+        Pairwise-complete correlation of all pairs of columns of a sparse position x track value matrix, where the
+        stored cells are the values present (stored zeros included). Each pair is correlated on the positions present
+        in both tracks. The sums needed for the Pearson coefficient of all pairs are found by matrix products, where
+        the matrix is processed in chunks of positions, made dense one at a time, so that a genome-wide matrix of many
+        tracks is never dense as a whole. Returns a dictionary with a triangular (condensed) correlation matrix, as a
+        list, for each correlation coefficient in corrStats.
+
+        For Spearman, each track is ranked once, and these ranks are used for pairs of tracks with values at the same
+        positions. See _getPartialPairCorrelations for the other pairs.
+        """
+        import numpy as np
+        from scipy.sparse import csr_matrix
+
+        valueMatrix = csr_matrix(valueMatrix, dtype=np.float64)
+        trackCount = valueMatrix.shape[1]
+        chunkSize = max(1, chunkValues // max(1, trackCount))
+        rows, cols = np.triu_indices(trackCount, 1)
+        corrDict = {}
+
+        if cls.CORR_PEARSON in corrStats:
+            sums = cls._getSparseSums(valueMatrix, chunkSize)
+            corrDict[cls.CORR_PEARSON] = cls._getCorrelationsFromSums(*sums)[rows, cols].tolist()
+
+        if cls.CORR_SPEARMAN in corrStats:
+            rankMatrix = valueMatrix.copy()
+            rankMatrix.data = cls._getGroupedRanks(valueMatrix.data, valueMatrix.indices)
+            sums = cls._getSparseSums(rankMatrix, chunkSize)
+            correlations = cls._getCorrelationsFromSums(*sums)[rows, cols]
+
+            overlaps = sums[0]
+            sizes = np.diag(overlaps)
+            isPartial = (overlaps[rows, cols] != sizes[rows]) | (overlaps[rows, cols] != sizes[cols])
+            correlations[isPartial] = cls._getPartialPairCorrelations(
+                valueMatrix.tocsc(), rows[isPartial], cols[isPartial]
+            )
+            corrDict[cls.CORR_SPEARMAN] = correlations.tolist()
+
+        return corrDict
+
+    @classmethod
+    def _getSparseSums(cls, valueMatrix, chunkSize):
+        """
+        Counts, sums, sums of squares and sums of products of each pair of columns of a sparse position x track
+        matrix, on the positions present in both, summed over dense chunks of chunkSize positions. See
+        _getCorrelationsFromSums.
+        """
+        import numpy as np
+
+        trackCount = valueMatrix.shape[1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Centering each column on its mean does not change the coefficients, but makes the sums more precise
+            means = np.bincount(valueMatrix.indices, valueMatrix.data, minlength=trackCount) / \
+                np.bincount(valueMatrix.indices, minlength=trackCount)
+
+        counts = np.zeros((trackCount, trackCount))
+        sums = np.zeros((trackCount, trackCount))
+        squareSums = np.zeros((trackCount, trackCount))
+        products = np.zeros((trackCount, trackCount))
+        for start in range(0, valueMatrix.shape[0], chunkSize):
+            chunk = valueMatrix[start:start + chunkSize]
+            chunkRows = np.repeat(np.arange(chunk.shape[0]), np.diff(chunk.indptr))
+
+            mask = np.zeros(chunk.shape)
+            mask[chunkRows, chunk.indices] = 1
+            values = np.zeros(chunk.shape)
+            values[chunkRows, chunk.indices] = chunk.data - means[chunk.indices]
+
+            counts += mask.T.dot(mask)
+            sums += values.T.dot(mask)
+            squareSums += (values ** 2).T.dot(mask)
+            products += values.T.dot(values)
+
+        return counts, sums, squareSums, products
+
+    @classmethod
+    def _getPartialPairCorrelations(cls, valueMatrix, rows, cols):
+        """
+        Spearman correlation of the pairs of columns (rows[k], cols[k]) of a sparse position x track matrix (CSC),
+        on the positions present in both columns.
+
+        The values of each track are sorted once. The ranks of a track within the overlap with another track are then
+        found by counting, in sorted order, the values at positions present in the other track, without sorting the
+        values of each pair.
+        """
+        import numpy as np
+
+        present = np.zeros(valueMatrix.shape[0], dtype=bool)
+        sortedTracks = {}
+
+        def getSortedTrack(track):
+            if track not in sortedTracks:
+                values = valueMatrix.data[valueMatrix.indptr[track]:valueMatrix.indptr[track + 1]]
+                order = np.argsort(values, kind='mergesort')
+                isNewValue = np.concatenate(([True], values[order][1:] != values[order][:-1]))[:len(values)]
+                sortedTracks[track] = (order, np.flatnonzero(isNewValue), np.cumsum(isNewValue) - 1)
+            return sortedTracks[track]
+
+        correlations = []
+        for i, j in zip(rows.tolist(), cols.tolist()):
+            positions1 = valueMatrix.indices[valueMatrix.indptr[i]:valueMatrix.indptr[i + 1]]
+            positions2 = valueMatrix.indices[valueMatrix.indptr[j]:valueMatrix.indptr[j + 1]]
+
+            present[positions2] = True
+            inOverlap1 = present[positions1]
+            present[positions2] = False
+            present[positions1] = True
+            inOverlap2 = present[positions2]
+            present[positions1] = False
+
+            # The positions of both tracks are sorted, so the ranks of the overlap are in the same order
+            ranks1 = cls._getOverlapRanks(getSortedTrack(i), inOverlap1)
+            ranks2 = cls._getOverlapRanks(getSortedTrack(j), inOverlap2)
+            correlations.extend(cls._getGroupedCorrelations(ranks1, ranks2, np.zeros(len(ranks1), dtype=np.intp), 1))
+
+        return correlations
+
+    @classmethod
+    def _getOverlapRanks(cls, sortedTrack, inOverlap):
+        """
+        Ranks of the values of a track in the overlap, in order of position, given the sort order of the track,
+        along with the start and index of each group of tied values in sorted order.
+        """
+        import numpy as np
+
+        order, tieStarts, tieIds = sortedTrack
+        if not inOverlap.any():
+            return np.zeros(0)
+
+        tieCounts = np.add.reduceat(inOverlap[order].astype(np.int64), tieStarts)
+        averageRanks = np.cumsum(tieCounts) - tieCounts + (tieCounts + 1) / 2.0
 
-        if corrStat == cls.CORR_PEARSON:
-            return pearsonr(vector1, vector2)[0]
-        elif corrStat == cls.CORR_SPEARMAN:
-            return spearmanr(vector1, vector2)[0]
+        ranks = np.empty(len(order))
+        ranks[order] = averageRanks[tieIds]
+        return ranks[inOverlap]
 
     @classmethod
     def _toSquareMatrix(cls, triangularMatrix):
@@ -77,7 +391,7 @@ class CommonCorrelationFunctions(CommonClusteringFunctions):
         htmlCore.smallHeader('Correlation with ' + corrStat)
         corr, linkage, distance = cls.getDistMatrixes(corrDict, corrStat, linkageCriterion)
         cls.printClusterPlots(corr, linkage, galaxyFn, corrStat, labels, htmlCore)
-        cls.printTextMatrixes(corr, linkage, distance, galaxyFn, corrStat, htmlCore)
+        cls.printTextMatrixes(corr, linkage, distance, galaxyFn, corrStat, htmlCore, labels)
         cls.findRanking(distance, labels, corrStat, htmlCore)
 
     @classmethod
@@ -5,68 +5,229 @@ class LDExpansions(object):
     In addition, it has functionality for finding positions from an LD graph track (linked point track).
     """
 
+    # Number of data lines of a linked point track read at a time, see readLinkedPointTrack
+    GTRACK_CHUNK_LINES = 100000
+
     @classmethod
     def createRSquareGraph(cls, ldGraphTrackName, r2_threshold):
         """
-        Creates a dictionary of all pairs in a linked point track.
+        Creates an LD graph of all pairs in a linked point track.
         Variants in LD must have rsquare >= the rsquare threshold passed to the function.
 
+        The first time a linked point track is used, the graph of all its pairs is saved in a binary cache, see
+        getLDGraphCacheDir. Later runs load the graph memory-mapped from the cache, rather than parsing the track.
+
         :param ldGraphTrackName: linked point track, as chosen in tool (choices.ldtrack)
         :param r2_threshold: Lower limit of square value
-        :return: Dictionary of all ld-pairs with sorted key = (rsid1, rsid2), value = rSquare
+        :return: LDGraph of all ld-pairs, with rSquare as weight, see quick/webtools/clustering/LDGraph.py
+        """
+        import os
+        from quick.webtools.clustering.LDGraph import LDGraph
+
+        cacheDir = cls.getLDGraphCacheDir(ldGraphTrackName)
+        if not os.path.exists(cacheDir):
+            cls.parseRSquareGraph(ldGraphTrackName).save(cacheDir)
+
+        return LDGraph.load(cacheDir, float(r2_threshold))
+
+    @classmethod
+    def getLDGraphCacheDir(cls, ldGraphTrackName):
+        """
+        Directory of the binary cache of the LD graph of a linked point track, in the static files of the
+        HyperBrowser, keyed as by getLDGraphKey. Concurrent jobs using the same track share the cache, and the
+        memory-mapped files in the page cache.
         """
+        from quick.util.StaticFile import StaticFile
+
+        cacheName = 'ld_graph_' + cls.getLDGraphKey(ldGraphTrackName)
+        return StaticFile(['files', 'clustering_cache', cacheName]).getDiskPath(True)
+
+    @classmethod
+    def getLDGraphKey(cls, ldGraphTrackName):
+        """
+        Key of the LD graph of a linked point track, from the version of the graph format and the path, size and
+        modification time of the track file, as for the snapshots of TrackSnapshot, so that the file is not read to
+        find the key. A track file that is changed gets a new key.
+        """
+        import hashlib
+        import os
         from quick.application.ExternalTrackManager import ExternalTrackManager
-        from gold.origdata.GtrackGenomeElementSource import GtrackGenomeElementSource
+        from quick.webtools.clustering.LDGraph import LDGraph
+
+        fileName = os.path.abspath(ExternalTrackManager.extractFnFromGalaxyTN(ldGraphTrackName))
+        key = hashlib.sha1()
+        key.update('\n'.join([
+            LDGraph.GRAPH_VERSION,
+            fileName,
+            str(os.path.getsize(fileName)),
+            repr(os.path.getmtime(fileName))
+        ]))
+        return key.hexdigest()
+
+    @classmethod
+    def parseRSquareGraph(cls, ldGraphTrackName):
+        """
+        Parses a linked point track into an LDGraph of all its pairs, along with the position and chromosome of
+        each element of the track, in one pass of the file. See readLinkedPointTrack.
+        """
+        from quick.application.ExternalTrackManager import ExternalTrackManager
+        from quick.webtools.clustering.LDGraph import LDGraph
 
         fileName = ExternalTrackManager.extractFnFromGalaxyTN(ldGraphTrackName)
-        suffix = ExternalTrackManager.extractFileSuffixFromGalaxyTN(ldGraphTrackName)
-        gtSource = GtrackGenomeElementSource(fileName, suffix=suffix)
+        trackArrays = cls.readLinkedPointTrack(fileName)
+        if trackArrays is None:
+            suffix = ExternalTrackManager.extractFileSuffixFromGalaxyTN(ldGraphTrackName)
+            trackArrays = cls._readGenomeElements(fileName, suffix)
 
-        r2graph = {}
+        return LDGraph.fromNodeIds(*trackArrays)
 
-        for ge in gtSource:
-            rsid = ge.id
-            edges = ge.edges
-            weights = ge.weights
+    @classmethod
+    def readLinkedPointTrack(cls, fileName, chunkLines=GTRACK_CHUNK_LINES):
+        """
+        Reads a linked point track (GTrack), with the columns seqid, start, id and edges, in one pass. The data lines
+        are read in chunks of chunkLines lines, where the edges ("rsid=r2;rsid=r2") of all lines of a chunk are
+        split at once, rather than creating a genome element for each line.
 
-            for i in range(0, len(edges)):
-                ldRsid = edges[i]
-                r2 = weights[i]
+        Returns the arrays (rsids, ids1, ids2, weights, positions, chromosomes, chromosomeNames), as taken by
+        LDGraph.fromNodeIds, where rsids holds the rsid of each node id, and positions and chromosomes the position
+        and chromosome of the first element of each rsid (-1 for rsids that are only found as edges). Returns None
+        if the header of the track is not supported, for instance if the edges have no weights, so that the track
+        can be read with GtrackGenomeElementSource.
+        """
+        from itertools import islice
+        import numpy as np
+
+        nodeIds = {}
+        chromosomeCodes = {}
+        elementNodes = []
+        elementStarts = []
+        elementChromosomes = []
+        edgeSources = []
+        edgeTargets = []
+        edgeWeights = []
+
+        with open(fileName) as trackFile:
+            headers, columns, lines = cls._readGtrackHeader(trackFile)
+            if headers.get('track type', 'linked points') != 'linked points' or \
+                    headers.get('edge weights', 'false') != 'true' or \
+                    not all(column in columns for column in ['seqid', 'start', 'id', 'edges']):
+                return None
+
+            seqidColumn, startColumn, idColumn, edgesColumn = [
+                columns.index(column) for column in ['seqid', 'start', 'id', 'edges']
+            ]
+
+            while lines:
+                rows = [line.rstrip('\r\n').split('\t') for line in lines
+                        if line.strip() and not line.startswith('#')]
+                edgeTexts = [row[edgesColumn] if row[edgesColumn] != '.' else '' for row in rows]
+                edgeCounts = [edges.count(';') + 1 if edges else 0 for edges in edgeTexts]
+                edgeParts = ';'.join(edges for edges in edgeTexts if edges).replace('=', ';').split(';')
+                if sum(edgeCounts) == 0:
+                    edgeParts = []
 
-                if r2 >= float(r2_threshold):
-                    cls.addEdge(r2graph, rsid, ldRsid, r2)
+                chunkNodes = np.array([nodeIds.setdefault(row[idColumn], len(nodeIds)) for row in rows],
+                                      dtype=np.int64)
+                elementNodes.append(chunkNodes)
+                elementStarts.append(np.array([int(row[startColumn]) for row in rows], dtype=np.int64))
+                elementChromosomes.append(np.array(
+                    [chromosomeCodes.setdefault(row[seqidColumn], len(chromosomeCodes)) for row in rows],
+                    dtype=np.int16
+                ))
+                edgeSources.append(np.repeat(chunkNodes, edgeCounts))
+                edgeTargets.append(np.array([nodeIds.setdefault(rsid, len(nodeIds)) for rsid in edgeParts[0::2]],
+                                            dtype=np.int64))
+                edgeWeights.append(np.array([float(r2) for r2 in edgeParts[1::2]]))
 
-        return r2graph
+                lines = list(islice(trackFile, chunkLines))
+
+        def concatenate(arrays, dtype):
+            return np.concatenate(arrays + [np.zeros(0, dtype=dtype)])
+
+        # Position and chromosome of the first element of each rsid, as the later assignments take precedence
+        elementNodes = concatenate(elementNodes, np.int64)[::-1]
+        positions = -np.ones(len(nodeIds), dtype=np.int64)
+        positions[elementNodes] = concatenate(elementStarts, np.int64)[::-1]
+        chromosomes = -np.ones(len(nodeIds), dtype=np.int16)
+        chromosomes[elementNodes] = concatenate(elementChromosomes, np.int16)[::-1]
+        if headers.get('1-indexed', 'false') == 'true':
+            positions[positions != -1] -= 1
+
+        return sorted(nodeIds, key=nodeIds.get), concatenate(edgeSources, np.int64), \
+            concatenate(edgeTargets, np.int64), concatenate(edgeWeights, np.float64), positions, chromosomes, \
+            sorted(chromosomeCodes, key=chromosomeCodes.get)
 
     @classmethod
-    def sortRsidTuple(cls, rsid1, rsid2):
-        id1 = int(rsid1[2:])
-        id2 = int(rsid2[2:])
-        return (rsid1, rsid2) if id1 < id2 else (rsid2, rsid1)
+    def _readGtrackHeader(cls, trackFile):
+        """
+        Reads the header lines (##key: value) and the column specification line (###col1 col2 ...) of a GTrack file.
+        Returns the headers, with keys and values in lower case, the columns, and the lines read after the header.
+        """
+        headers = {}
+        columns = []
+        line = trackFile.readline()
+        while line.startswith('#'):
+            if line.startswith('###') and not line.startswith('####'):
+                columns = line[3:].strip().split('\t')
+            elif line.startswith('##') and not line.startswith('###') and ':' in line:
+                key, value = line[2:].split(':', 1)
+                headers[key.strip().lower()] = value.strip().lower()
+            line = trackFile.readline()
+
+        return headers, columns, [line] if line else []
 
     @classmethod
-    def addEdge(cls, r2graph, rsid1, rsid2, r2):
-        key = cls.sortRsidTuple(rsid1, rsid2)
-        if key not in r2graph:
-            r2graph[key] = r2
+    def _readGenomeElements(cls, fileName, suffix):
+        """
+        Reads a linked point track with GtrackGenomeElementSource, one genome element at a time. Returns the same
+        arrays as readLinkedPointTrack.
+        """
+        from array import array
+        from gold.origdata.GtrackGenomeElementSource import GtrackGenomeElementSource
+
+        gtSource = GtrackGenomeElementSource(fileName, suffix=suffix)
+
+        nodeIds = {}
+        chromosomeCodes = {}
+        ids1 = array('i')
+        ids2 = array('i')
+        weights = array('d')
+        positions = array('l')
+        chromosomes = array('h')
+
+        def getNodeId(rsid):
+            if rsid not in nodeIds:
+                nodeIds[rsid] = len(nodeIds)
+                positions.append(-1)
+                chromosomes.append(-1)
+            return nodeIds[rsid]
+
+        for ge in gtSource:
+            nodeId = getNodeId(ge.id)
+            if positions[nodeId] == -1:
+                positions[nodeId] = ge.start
+                chromosomes[nodeId] = chromosomeCodes.setdefault(ge.chr, len(chromosomeCodes))
+
+            edges = ge.edges
+            ldWeights = ge.weights
+            for i in range(0, len(edges)):
+                ids1.append(nodeId)
+                ids2.append(getNodeId(edges[i]))
+                weights.append(ldWeights[i])
+
+        return sorted(nodeIds, key=nodeIds.get), ids1, ids2, weights, positions, chromosomes, \
+            sorted(chromosomeCodes, key=chromosomeCodes.get)
 
     @classmethod
     def getEdge(cls, rsid1, rsid2, graph):
         """
-        Sorts the node ids, i.e. rsids, to get uniform key and finds the edge value between the nodes.
+        Finds the edge value between the nodes, see LDGraph.getEdge.
         :param rsid1: Node id 1
         :param rsid2: Node id 2
         :param graph: Graph to find node pair in
         :return: rsquare value between nodes, 1 if completely similar, 0 if no correlation (not in graph)
         """
-        if rsid1 == rsid2:
-            return 1
-
-        key = cls.sortRsidTuple(rsid1, rsid2)
-        if key in graph:
-            return graph[key]
-        else:
-            return 0
+        return graph.getEdge(rsid1, rsid2)
 
     @classmethod
     def generateTracksAndLabels(cls, gSuite, analysisBins):
@@ -98,32 +259,22 @@ class LDExpansions(object):
     def createPositionDict(cls, ldGraphTrackName):
         """
         Creates position dictionary from linked point track. To be used for empiric exploration of positions,
-        based on LD correlation (rsquare values)
+        based on LD correlation (rsquare values). The positions are found in the LD graph of the track, see
+        createRSquareGraph.
         :param ldGraphTrackName: linked point track, as chosen in tool (choices.ldtrack)
         :return: Dictionary of all nodes in track with key = rsid, value = position
 
         """
-        from quick.application.ExternalTrackManager import ExternalTrackManager
-        from gold.origdata.GtrackGenomeElementSource import GtrackGenomeElementSource
-
-        fileName = ExternalTrackManager.extractFnFromGalaxyTN(ldGraphTrackName)
-        suffix = ExternalTrackManager.extractFileSuffixFromGalaxyTN(ldGraphTrackName)
-        gtSource = GtrackGenomeElementSource(fileName, suffix=suffix)
+        graph = cls.createRSquareGraph(ldGraphTrackName, 0)
+        positions = graph.getPositions()
 
         positionDict = {}
-
-        for ge in gtSource:
-            rsid = ge.id
-            position = ge.start
-            cls.addPosition(positionDict, rsid, position)
+        for nodeId in range(graph.getNodeCount()):
+            if positions[nodeId] != -1:
+                positionDict[graph.getRsid(nodeId)] = int(positions[nodeId])
 
         return positionDict
 
-    @classmethod
-    def addPosition(cls, positionDict, rsid, position):
-        if rsid not in positionDict:
-            positionDict[rsid] = position
-
     @classmethod
     def getPosition(cls, positionDict, rsid):
         if rsid in positionDict:
@@ -0,0 +1,298 @@
+class LDGraph(object):
+    """
+    Compact, undirected LD graph, where the nodes are rsids and the edges are weighted by rsquare values.
+
+    The rsids are stored as a sorted array, and the node id of an rsid is its index in this array, found with binary
+    search. The edges are stored in compressed sparse row (CSR) form: the neighbours of node k are
+    neighbourIds[indptr[k]:indptr[k + 1]], sorted on node id, with the rsquare value of each edge in the r2 array.
+    Node ids are stored as int32 and rsquare values as uint16, so an edge takes 12 bytes (stored in both
+    directions), rather than a dictionary entry with a tuple of two strings as key. An edge is found with binary
+    search in the neighbours of one of the nodes. The position and chromosome of each node are stored along with
+    the graph, for nodes that are elements of the linked point track (-1 and '' for other nodes).
+
+    Rsquare values are quantized to steps of 1 / R2_SCALE, so that they are stored with two bytes per weight, and
+    converted to float32 as they are looked up, see getWeights. If an edge is given several times, e.g. in both
+    directions, the highest weight is kept, so that the edge is kept at a threshold if any of its weights is at or
+    above it. Edges from a node to itself are left out, as getEdge always returns 1 for identical rsids.
+
+    The graph can be saved to a directory of NumPy files, and loaded memory-mapped, see save and load. The edges
+    with rsquare at or above a threshold are saved in a subdirectory of the graph the first time the threshold is
+    used, so that a loaded graph never holds private copies of the edge arrays.
+
+    Example usage:
+
+    graph = LDGraph.fromEdges(['rs1', 'rs1'], ['rs2', 'rs3'], [0.9, 0.5])
+    graph.getEdge('rs3', 'rs1')  # 0.5
+    graph.neighbours('rs1')  # [('rs2', 0.9), ('rs3', 0.5)]
+    """
+
+    GRAPH_VERSION = '2'
+    R2_SCALE = 10000
+    ARRAY_NAMES = ['rsids', 'indptr', 'neighbourIds', 'r2', 'positions', 'chromosomes', 'chromosomeNames']
+    EDGE_ARRAY_NAMES = ['indptr', 'neighbourIds', 'r2']
+
+    def __init__(self, rsids, indptr, neighbourIds, r2, positions=None, chromosomes=None, chromosomeNames=None):
+        """
+        Takes in the sorted rsids, the CSR arrays of the edges, where the rsquare values are quantized (see
+        quantizeWeights), and optionally the position and chromosome (as an index into chromosomeNames) of each
+        node.
+        """
+        import numpy as np
+
+        self._rsids = rsids
+        self._indptr = indptr
+        self._neighbourIds = neighbourIds
+        self._r2 = r2
+        self._positions = positions if positions is not None else -np.ones(len(rsids), dtype=np.int64)
+        self._chromosomes = chromosomes if chromosomes is not None else -np.ones(len(rsids), dtype=np.int16)
+        self._chromosomeNames = chromosomeNames if chromosomeNames is not None else np.zeros(0, dtype=str)
+
+    @classmethod
+    def fromEdges(cls, rsids1, rsids2, weights):
+        """Creates the graph from lists of the rsids and weights of each edge, in order of insertion."""
+        import numpy as np
+
+        nodeIds = {}
+        ids1 = np.array([nodeIds.setdefault(rsid, len(nodeIds)) for rsid in rsids1], dtype=np.int32)
+        ids2 = np.array([nodeIds.setdefault(rsid, len(nodeIds)) for rsid in rsids2], dtype=np.int32)
+        rsids = sorted(nodeIds, key=nodeIds.get)
+        return cls.fromNodeIds(rsids, ids1, ids2, weights)
+
+    @classmethod
+    def fromNodeIds(cls, rsids, ids1, ids2, weights, positions=None, chromosomes=None, chromosomeNames=None):
+        """
+        Creates the graph from the node ids of each edge, in order of insertion, where rsids holds the (unique) rsid
+        of each node id. Positions and chromosomes optionally hold the position and chromosome (as an index into
+        chromosomeNames) of each node id.
+        """
+        import numpy as np
+
+        rsids = np.array(rsids, dtype=str)
+        nodeCount = len(rsids)
+
+        # Node ids are renumbered in sorted order of the rsids
+        order = np.argsort(rsids, kind='mergesort')
+        sortedIds = np.empty(nodeCount, dtype=np.int64)
+        sortedIds[order] = np.arange(nodeCount)
+        ids1 = sortedIds[np.asarray(ids1, dtype=np.int64)]
+        ids2 = sortedIds[np.asarray(ids2, dtype=np.int64)]
+        weights = cls.quantizeWeights(weights)
+
+        # One weight for each undirected edge: the highest, as the edges are sorted on key and then on decreasing
+        # weight, and the first occurrence of each key is kept
+        notLoop = ids1 != ids2
+        low = np.minimum(ids1, ids2)[notLoop]
+        high = np.maximum(ids1, ids2)[notLoop]
+        weights = weights[notLoop]
+        edgeKeys = low * nodeCount + high
+        keyOrder = np.lexsort((-weights.astype(np.int32), edgeKeys))
+        keys, first = np.unique(edgeKeys[keyOrder], return_index=True)
+        weights = weights[keyOrder][first]
+        low = keys // nodeCount
+        high = keys % nodeCount
+
+        # Both directions of each edge, sorted on node and then on neighbour
+        nodes = np.concatenate([low, high])
+        neighbours = np.concatenate([high, low])
+        edgeOrder = np.argsort(nodes * nodeCount + neighbours)
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(nodes, minlength=nodeCount)))).astype(np.int64)
+
+        if positions is not None:
+            positions = np.asarray(positions, dtype=np.int64)[order]
+        if chromosomes is not None:
+            chromosomes = np.asarray(chromosomes, dtype=np.int16)[order]
+            chromosomeNames = np.array(chromosomeNames, dtype=str)
+
+        return cls(rsids[order], indptr, neighbours[edgeOrder].astype(np.int32),
+                   np.concatenate([weights, weights])[edgeOrder], positions, chromosomes, chromosomeNames)
+
+    @classmethod
+    def quantizeWeights(cls, weights):
+        """Rsquare values as integer steps of 1 / R2_SCALE, stored as uint16."""
+        import numpy as np
+        return np.round(np.clip(np.asarray(weights, dtype=np.float64), 0, 1) * cls.R2_SCALE).astype(np.uint16)
+
+    @classmethod
+    def getWeights(cls, quantizedWeights):
+        """Rsquare values, as float32, of quantized weights."""
+        import numpy as np
+        return (np.asarray(quantizedWeights, dtype=np.float64) / cls.R2_SCALE).astype(np.float32)
+
+    def save(self, directory):
+        """Saves the graph as NumPy files in a directory, which is created, see _saveArrays."""
+        arrays = {
+            'rsids': self._rsids,
+            'indptr': self._indptr,
+            'neighbourIds': self._neighbourIds,
+            'r2': self._r2,
+            'positions': self._positions,
+            'chromosomes': self._chromosomes,
+            'chromosomeNames': self._chromosomeNames
+        }
+        self._saveArrays(directory, arrays)
+
+    @classmethod
+    def _saveArrays(cls, directory, arrays):
+        """
+        Saves a dictionary of arrays as NumPy files in a directory, which is created. The arrays are written to a
+        temporary directory first, so that other processes never load a partly written graph.
+        """
+        import os
+        import shutil
+        import tempfile
+        import numpy as np
+
+        tempDir = tempfile.mkdtemp(dir=os.path.dirname(directory))
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tempDir, name + '.npy'), array)
+            os.rename(tempDir, directory)
+        except OSError:
+            # Another process saved the same arrays in the meantime
+            shutil.rmtree(tempDir, ignore_errors=True)
+            if not os.path.exists(directory):
+                raise
+
+    @classmethod
+    def load(cls, directory, minR2=0):
+        """
+        Loads a graph saved with save, where the arrays are memory-mapped. Only edges with rsquare >= minR2, at the
+        resolution of the quantized weights, are kept.
+
+        The first time a graph is loaded with a threshold, the edges at or above it are saved in the subdirectory
+        r2_<quantized threshold> of the graph, which later loads with the same threshold memory-map, like the rest
+        of the graph.
+        """
+        import os
+        import numpy as np
+
+        arrays = {}
+        for name in cls.ARRAY_NAMES:
+            arrays[name] = np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+
+        minQuantizedR2 = cls.quantizeWeights([minR2])[0]
+        if minQuantizedR2 > 0:
+            edgeDirectory = os.path.join(directory, 'r2_' + str(minQuantizedR2))
+            if not os.path.exists(edgeDirectory):
+                cls._saveArrays(edgeDirectory, cls._getFilteredEdgeArrays(arrays, minQuantizedR2))
+            for name in cls.EDGE_ARRAY_NAMES:
+                arrays[name] = np.load(os.path.join(edgeDirectory, name + '.npy'), mmap_mode='r')
+
+        return cls(arrays['rsids'], arrays['indptr'], arrays['neighbourIds'], arrays['r2'], arrays['positions'],
+                   arrays['chromosomes'], arrays['chromosomeNames'])
+
+    @classmethod
+    def _getFilteredEdgeArrays(cls, arrays, minQuantizedR2):
+        """The CSR arrays of the edges with a quantized rsquare >= minQuantizedR2."""
+        import numpy as np
+
+        keep = arrays['r2'] >= minQuantizedR2
+        return {
+            'indptr': np.concatenate(([0], np.cumsum(keep)))[arrays['indptr']],
+            'neighbourIds': arrays['neighbourIds'][keep],
+            'r2': arrays['r2'][keep]
+        }
+
+    def __len__(self):
+        """Number of (undirected) edges in the graph."""
+        return len(self._neighbourIds) // 2
+
+    def getNodeCount(self):
+        return len(self._rsids)
+
+    def getNodeId(self, rsid):
+        """Node id of an rsid, or -1 if the rsid is not in the graph."""
+        import numpy as np
+
+        nodeId = np.searchsorted(self._rsids, rsid)
+        if nodeId < len(self._rsids) and self._rsids[nodeId] == rsid:
+            return int(nodeId)
+        return -1
+
+    def getNodeIds(self, rsids):
+        """Node ids of a list of rsids, as a numpy array, with -1 for rsids not in the graph."""
+        import numpy as np
+
+        rsids = np.array(rsids, dtype=str)
+        if len(self._rsids) == 0:
+            return -np.ones(len(rsids), dtype=np.int64)
+
+        nodeIds = np.minimum(np.searchsorted(self._rsids, rsids), len(self._rsids) - 1)
+        return np.where(self._rsids[nodeIds] == rsids, nodeIds, -1)
+
+    def getRsid(self, nodeId):
+        return str(self._rsids[nodeId])
+
+    def getPosition(self, rsid):
+        """Position of an rsid, or -1 if the position is not known."""
+        nodeId = self.getNodeId(rsid)
+        return int(self._positions[nodeId]) if nodeId >= 0 else -1
+
+    def getChromosome(self, rsid):
+        """Chromosome of an rsid, or an empty string if the chromosome is not known."""
+        nodeId = self.getNodeId(rsid)
+        if nodeId < 0 or self._chromosomes[nodeId] < 0:
+            return ''
+        return str(self._chromosomeNames[self._chromosomes[nodeId]])
+
+    def getPositions(self):
+        """Position of each node, -1 if not known, as a numpy array."""
+        return self._positions
+
+    def getEdge(self, rsid1, rsid2):
+        """
+        Rsquare value of the edge between two rsids, 1 if the rsids are identical, and 0 if there is no edge.
+        """
+        import numpy as np
+
+        if rsid1 == rsid2:
+            return 1
+
+        nodeId1 = self.getNodeId(rsid1)
+        nodeId2 = self.getNodeId(rsid2)
+        if nodeId1 < 0 or nodeId2 < 0:
+            return 0
+
+        start = self._indptr[nodeId1]
+        end = self._indptr[nodeId1 + 1]
+        index = start + np.searchsorted(self._neighbourIds[start:end], nodeId2)
+        if index < end and self._neighbourIds[index] == nodeId2:
+            return float(self.getWeights([self._r2[index]])[0])
+        return 0
+
+    def neighbours(self, rsid):
+        """List of (rsid, rsquare) of the neighbours of an rsid, sorted on node id."""
+        nodeId = self.getNodeId(rsid)
+        if nodeId < 0:
+            return []
+
+        start = self._indptr[nodeId]
+        end = self._indptr[nodeId + 1]
+        return [(self.getRsid(neighbourId), float(weight))
+                for neighbourId, weight in zip(self._neighbourIds[start:end], self.getWeights(self._r2[start:end]))]
+
+    def getNeighbourArrays(self):
+        """
+        The CSR arrays (indptr, neighbourIds, r2) of the graph, see the class description, where the rsquare values
+        are quantized. Use getWeights for the rsquare values of the edges that are looked up.
+        """
+        return self._indptr, self._neighbourIds, self._r2
+
+    def getEdgeArrays(self):
+        """
+        Node ids and weights of each undirected edge, as three numpy arrays (ids1, ids2, weights), where ids1 < ids2.
+        """
+        import numpy as np
+
+        nodes = np.repeat(np.arange(self.getNodeCount(), dtype=np.int32), np.diff(self._indptr))
+        isLower = nodes < self._neighbourIds
+        return nodes[isLower], np.asarray(self._neighbourIds[isLower]), self.getWeights(self._r2[isLower])
+
+    def items(self):
+        """
+        Iterates over ((rsid1, rsid2), rsquare) of each undirected edge, as the items of a dictionary keyed on rsid
+        pairs.
+        """
+        ids1, ids2, weights = self.getEdgeArrays()
+        for nodeId1, nodeId2, weight in zip(ids1.tolist(), ids2.tolist(), weights.tolist()):
+            yield (self.getRsid(nodeId1), self.getRsid(nodeId2)), weight
@@ -0,0 +1,174 @@
+class LinearAssignment(object):
+    """
+    Solvers for the linear assignment problem (LAP), used for optimal bipartite matching of two tracks.
+
+    findMaximumMatching takes in a len(track1) x len(track2) matrix, dense or sparse, where the cells are weights
+    between the nodes in the tracks, and finds the matching with the highest total weight. Only cells with a weight
+    are used: rows and columns without weights are left out, and the bipartite graph of the cells is split into
+    connected components, which are matched one at a time. A component is matched as a small, dense, rectangular
+    assignment problem, so the matrix is never padded to a square.
+
+    Two backends are provided for the assignment problems:
+    SCIPY: scipy.optimize.linear_sum_assignment
+    NUMPY: Shortest augmenting path algorithm, as in Jonker and Volgenant (1987) and Crouse (2016), where the
+        search over the columns is vectorized with NumPy
+
+    The default backend is SCIPY from SciPy 1.4, where linear_sum_assignment is a compiled shortest augmenting path
+    solver, and NUMPY otherwise, as earlier versions of SciPy solve the problem with the Hungarian algorithm in pure
+    Python, which is far slower than the NumPy backend for components of more than a few hundred SNPs.
+
+    Example usage:
+
+    rows, cols = LinearAssignment.findMaximumMatching(cost_matrix)
+    score = cost_matrix[rows, cols].sum()
+    """
+
+    SCIPY = 'scipy'
+    NUMPY = 'numpy'
+    BACKENDS = [SCIPY, NUMPY]
+    MIN_SCIPY_VERSION = '1.4'
+
+    @classmethod
+    def getDefaultBackend(cls):
+        from distutils.version import LooseVersion
+        import scipy
+
+        if LooseVersion(scipy.__version__) >= LooseVersion(cls.MIN_SCIPY_VERSION):
+            return cls.SCIPY
+        return cls.NUMPY
+
+    @classmethod
+    def findMaximumMatching(cls, weights, backend=None):
+        """
+        Takes in a matrix of weights >= 0, dense or sparse, and returns the rows and columns of the matched cells, as
+        two numpy arrays, where each row and each column is matched at most once. Only cells with a weight are
+        matched.
+        """
+        import numpy as np
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        cells = coo_matrix(weights)
+        cells.sum_duplicates()
+        isPositive = cells.data > 0
+        rows = cells.row[isPositive]
+        cols = cells.col[isPositive]
+        values = cells.data[isPositive]
+        if len(values) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        # Connected components of the bipartite graph, where the nodes are the rows followed by the columns
+        rowCount, colCount = cells.shape
+        graph = coo_matrix((np.ones(len(values)), (rows, rowCount + cols)),
+                           shape=(rowCount + colCount, rowCount + colCount))
+        _, labels = connected_components(graph, directed=False)
+        order = np.argsort(labels[rows], kind='mergesort')
+        rows = rows[order]
+        cols = cols[order]
+        values = values[order]
+        _, starts, counts = np.unique(labels[rows], return_index=True, return_counts=True)
+
+        # A component of one cell is matched as it is
+        isSingle = counts == 1
+        matchedRows = [rows[starts[isSingle]]]
+        matchedCols = [cols[starts[isSingle]]]
+
+        for start, count in zip(starts[~isSingle].tolist(), counts[~isSingle].tolist()):
+            componentRows, rowIndexes = np.unique(rows[start:start + count], return_inverse=True)
+            componentCols, colIndexes = np.unique(cols[start:start + count], return_inverse=True)
+            componentWeights = np.zeros((len(componentRows), len(componentCols)))
+            componentWeights[rowIndexes, colIndexes] = values[start:start + count]
+
+            assignedRows, assignedCols = cls.solve(-componentWeights, backend)
+            isMatch = componentWeights[assignedRows, assignedCols] > 0
+            matchedRows.append(componentRows[assignedRows[isMatch]])
+            matchedCols.append(componentCols[assignedCols[isMatch]])
+
+        return np.concatenate(matchedRows).astype(np.int64), np.concatenate(matchedCols).astype(np.int64)
+
+    @classmethod
+    def solve(cls, costs, backend=None):
+        """
+        Takes in a dense, rectangular matrix of costs, and returns the rows and columns of the assignment with the
+        lowest total cost, where min(rows, columns) cells are assigned, as two numpy arrays sorted on row.
+        """
+        if backend is None:
+            backend = cls.getDefaultBackend()
+
+        if backend == cls.SCIPY:
+            from scipy.optimize import linear_sum_assignment
+            return linear_sum_assignment(costs)
+        elif backend == cls.NUMPY:
+            return cls._solveShortestAugmentingPath(costs)
+        else:
+            raise ValueError('Unknown linear assignment backend: ' + str(backend))
+
+    @classmethod
+    def _solveShortestAugmentingPath(cls, costs):
+        """
+        Assigns one row at a time along the shortest augmenting path from the row to an unassigned column, found by
+        Dijkstra's algorithm on the reduced costs, and updates the dual variables u (rows) and v (columns), such that
+        the reduced costs stay non-negative. Each step of the search scans all columns with NumPy.
+        """
+        import numpy as np
+
+        costs = np.asarray(costs, dtype=np.float64)
+        isTransposed = costs.shape[0] > costs.shape[1]
+        if isTransposed:
+            costs = costs.T
+        rowCount, colCount = costs.shape
+
+        u = np.zeros(rowCount)
+        v = np.zeros(colCount)
+        colForRow = -np.ones(rowCount, dtype=np.int64)
+        rowForCol = -np.ones(colCount, dtype=np.int64)
+
+        for freeRow in range(rowCount):
+            shortestPathCosts = np.full(colCount, np.inf)
+            path = -np.ones(colCount, dtype=np.int64)
+            scannedRows = np.zeros(rowCount, dtype=bool)
+            scannedCols = np.zeros(colCount, dtype=bool)
+
+            row = freeRow
+            minValue = 0.0
+            sink = -1
+            while sink < 0:
+                scannedRows[row] = True
+                reducedCosts = minValue + costs[row] - u[row] - v
+                isShorter = ~scannedCols & (reducedCosts < shortestPathCosts)
+                path[isShorter] = row
+                shortestPathCosts[isShorter] = reducedCosts[isShorter]
+
+                # The closest column not yet scanned, preferring an unassigned column among ties
+                remainingCosts = np.where(scannedCols, np.inf, shortestPathCosts)
+                minValue = remainingCosts.min()
+                closest = remainingCosts == minValue
+                isUnassigned = closest & (rowForCol < 0)
+                col = int(np.argmax(isUnassigned)) if isUnassigned.any() else int(np.argmax(closest))
+
+                scannedCols[col] = True
+                if rowForCol[col] < 0:
+                    sink = col
+                else:
+                    row = rowForCol[col]
+
+            # Update the dual variables
+            u[freeRow] += minValue
+            otherRows = scannedRows.copy()
+            otherRows[freeRow] = False
+            u[otherRows] += minValue - shortestPathCosts[colForRow[otherRows]]
+            v[scannedCols] -= minValue - shortestPathCosts[scannedCols]
+
+            # Augment the assignment along the path
+            col = sink
+            while True:
+                row = path[col]
+                rowForCol[col] = row
+                col, colForRow[row] = colForRow[row], col
+                if row == freeRow:
+                    break
+
+        if isTransposed:
+            order = np.argsort(colForRow)
+            return colForRow[order], order
+        return np.arange(rowCount), colForRow
@@ -17,8 +17,25 @@ class MatplotlibPlots(object):
 
     For plots that should be used in articles, pdf format is recommended. It scales very well, as they do not compress
     or blur the figure at different sizes.
+
+    For large matrices, with one patch per cell, vector graphics become slow to render and view. rasterHeatmapPlot
+    draws the cells as one image inside the pdf, and blockAverage can be used to create a smaller overview of a matrix.
     """
 
+    # Heatmaps with more rows than this are rasterized and ordered by the dendrogram leaves
+    LARGE_HEATMAP_SIZE = 300
+
+    # Heatmaps with more rows than this are block averaged into an overview, with the details in tiles
+    OVERVIEW_SIZE = 500
+    TILE_SIZE = 100
+
+    # Tick labels are only drawn for heatmaps with at most this number of rows
+    MAX_TICK_LABELS = 100
+
+    # Dendrograms with more leaves than this are truncated to the given number of clusters
+    LARGE_DENDROGRAM_SIZE = 200
+    TRUNCATED_DENDROGRAM_LEAVES = 50
+
     @classmethod
     def saveFigure(cls, fig, fileLocation):
         from matplotlib import pyplot as plt
@@ -26,7 +43,12 @@ class MatplotlibPlots(object):
         plt.close(fig)
 
     @classmethod
-    def dendrogramClusteringPlot(cls, linkageMatrix, labels, fileLocation):
+    def dendrogramClusteringPlot(cls, linkageMatrix, labels, fileLocation, truncateMode=None, p=30, cutHeight=None):
+        """
+        For large linkage matrices, the dendrogram can be truncated, as in scipy.cluster.hierarchy.dendrogram, with
+        truncateMode 'lastp' (only the last p merged clusters are shown) or 'level' (only p levels from the top).
+        With cutHeight, all clusters merged below the given distance are collapsed into one leaf.
+        """
         from matplotlib import pyplot as plt
         import scipy.cluster.hierarchy as sch
         import numpy as np
@@ -38,11 +60,20 @@ class MatplotlibPlots(object):
         plt.title('Hierarchical Clustering Dendrogram')
         plt.ylabel('Distance')
 
+        truncateOptions = {}
+        if cutHeight is not None:
+            truncateMode = 'lastp'
+            p = int(sch.fcluster(linkageMatrix, cutHeight, criterion='distance').max())
+            plt.axhline(cutHeight, color='grey', linestyle='--')
+        if truncateMode is not None:
+            truncateOptions = dict(truncate_mode=truncateMode, p=p, show_contracted=True)
+
         sch.dendrogram(
             linkageMatrix,
             labels=labels,
             leaf_rotation=270,   # rotates the x axis labels
-            color_threshold=np.inf
+            color_threshold=np.inf,
+            **truncateOptions
         )
         plt.plot()
         cls.saveFigure(fig, fileLocation)
@@ -62,6 +93,66 @@ class MatplotlibPlots(object):
         axes.invert_xaxis()
         cls.saveFigure(heatmap, fileName)
 
+    @classmethod
+    def rasterHeatmapPlot(cls, data, labels, fileName, max=1, min=0, cmap='Reds', title=None):
+        """
+        Heatmap where the cells are drawn as a single raster image, so that the time used to render it, and the size
+        of the file, does not depend on the number of cells. Labels are only drawn for small matrices.
+        """
+        from matplotlib import pyplot as plt
+
+        a4_dims = (11.7, 8.27)
+        heatmap, axes = plt.subplots(figsize=a4_dims)
+        image = axes.imshow(data, vmin=min, vmax=max, cmap=cmap, interpolation='nearest', aspect='equal',
+                            rasterized=True)
+        heatmap.colorbar(image)
+
+        if labels is not None and len(labels) <= cls.MAX_TICK_LABELS:
+            axes.set_xticks(range(len(labels)))
+            axes.set_yticks(range(len(labels)))
+            axes.set_xticklabels(labels, rotation=270)
+            axes.set_yticklabels(labels)
+            plt.subplots_adjust(left=0.4, bottom=0.4)
+        else:
+            axes.set_xticks([])
+            axes.set_yticks([])
+
+        if title:
+            axes.set_title(title)
+        cls.saveFigure(heatmap, fileName)
+
+    @classmethod
+    def getLeafOrder(cls, linkageMatrix):
+        """Order of the rows of a matrix, as the leaves of the dendrogram of the linkage matrix, from left to right."""
+        from scipy.cluster.hierarchy import leaves_list
+        return leaves_list(linkageMatrix)
+
+    @classmethod
+    def blockAverage(cls, data, blockSize):
+        """
+        Downsamples a square matrix, by replacing each block of blockSize x blockSize cells with their mean value.
+        The last block of each row and column may be smaller. NaN values are ignored.
+        """
+        import numpy as np
+
+        size = len(data)
+        blockCount = (size + blockSize - 1) // blockSize
+        padded = np.full((blockCount * blockSize, blockCount * blockSize), np.nan)
+        padded[:size, :size] = data
+        blocks = padded.reshape(blockCount, blockSize, blockCount, blockSize).swapaxes(1, 2)
+        blocks = blocks.reshape(blockCount, blockCount, blockSize * blockSize)
+
+        valid = ~np.isnan(blocks)
+        counts = valid.sum(axis=2)
+        sums = np.where(valid, blocks, 0).sum(axis=2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+    @classmethod
+    def getDiagonalTiles(cls, size, tileSize):
+        """Ranges (start, end) of the tiles along the diagonal of a square matrix."""
+        return [(start, min(start + tileSize, size)) for start in range(0, size, tileSize)]
+
     @classmethod
     def pointGraphY(cls, y, fileLocation, xlabel='', ylabel='', xticks=None):
         import matplotlib.pyplot as plt
@@ -0,0 +1,80 @@
+_pairFunction = None
+
+
+def _computePair(task):
+    """
+    Runs in the worker processes. The function of the pairs is not passed to the workers, as closures can not be
+    pickled, but is inherited from the parent process when the workers are forked.
+    """
+    index, (i, j) = task
+    return index, _pairFunction(i, j)
+
+
+class PairExecutor(object):
+    """
+    Runs the evaluation of pairs of tracks on a pool of worker processes.
+
+    Pairs are given as a list of (i, j) index pairs, usually in the order of the triangular distance matrix, along with
+    a function that takes in i and j and returns the result of the pair (for instance a dictionary of the matches a, b,
+    c and d). The results are returned in the same order as the pairs, no matter in which order they were computed.
+
+    For load balance, the most costly pairs are started first, as estimated by the product of the track sizes. With
+    a single worker, or a single pair, the pairs are computed in the current process.
+
+    Example usage:
+
+    def computePair(i, j):
+        return doAnalysis(analysisSpec, analysisBins, [tracks[i], tracks[j]]).getGlobalResult()
+
+    costs = PairExecutor.getPairCosts(trackSizes, indexPairs)
+    counts = PairExecutor.run(computePair, indexPairs, costs, workerCount=8)
+    """
+
+    DEFAULT_WORKER_COUNT = 1
+
+    @classmethod
+    def getIndexPairs(cls, trackCount):
+        """All (i, j) index pairs, i < j, in the order of the triangular distance matrix."""
+        return [(i, j) for i in range(trackCount) for j in range(i + 1, trackCount)]
+
+    @classmethod
+    def getPairCosts(cls, trackSizes, indexPairs):
+        """Estimated cost of each pair, as the product of the sizes of the two tracks."""
+        return [float(trackSizes[i]) * trackSizes[j] for i, j in indexPairs]
+
+    @classmethod
+    def run(cls, computePair, indexPairs, costs=None, workerCount=DEFAULT_WORKER_COUNT):
+        """
+        Computes the result of each pair with computePair(i, j), on workerCount processes.
+        Returns a list of results in the order of indexPairs.
+        """
+        indexPairs = list(indexPairs)
+        workerCount = min(workerCount, len(indexPairs))
+        if workerCount <= 1:
+            return [computePair(i, j) for i, j in indexPairs]
+
+        return cls._runOnPool(computePair, indexPairs, costs, workerCount)
+
+    @classmethod
+    def _runOnPool(cls, computePair, indexPairs, costs, workerCount):
+        from multiprocessing import Pool
+        global _pairFunction
+
+        order = range(len(indexPairs))
+        if costs is not None:
+            order = sorted(order, key=lambda index: -costs[index])
+
+        results = [None] * len(indexPairs)
+        _pairFunction = computePair
+        pool = Pool(workerCount)
+        try:
+            tasks = [(index, indexPairs[index]) for index in order]
+            for index, result in pool.imap_unordered(_computePair, tasks):
+                results[index] = result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+            _pairFunction = None
+
+        return results
@@ -0,0 +1,86 @@
+class PairResultStore(object):
+    """
+    On-disk store of match counts (a, b, c and d) for pairs of tracks, so that clustering tools only compute the pairs
+    of tracks that have not been seen in an earlier run.
+
+    Each pair is keyed by a content hash of both tracks, along with a key for the statistic (or matching algorithm)
+    and the parameters used, as created by getStatKey. As the tracks are identified by content, rather than name,
+    a re-run with a different linkage criterion or distance measure, or with new tracks added to the GSuite, will
+    reuse all counts of pairs computed previously. Tracks with identical content are also only computed once.
+
+    The counts are stored in an sqlite database in the static files of the HyperBrowser, shared by all runs.
+
+    Example usage:
+
+    store = PairResultStore(PairResultStore.getStatKey('DistanceMetricsBlockFoundationStat', filterThreshold=500000))
+    counts = store.getCounts([(hash1, hash2)])
+    store.addCounts({(hash1, hash2): {'a': 1, 'b': 2, 'c': 3, 'd': -1}})
+    store.close()
+    """
+
+    STORE_VERSION = '1'
+
+    def __init__(self, statKey, fileName=None):
+        import sqlite3
+
+        if fileName is None:
+            from quick.util.StaticFile import StaticFile
+            fileName = StaticFile(['files', 'clustering_cache', 'pair_results.sqlite']).getDiskPath(True)
+
+        self._statKey = statKey
+        self._connection = sqlite3.connect(fileName, timeout=60)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS pairs ('
+            'statKey TEXT, hash1 TEXT, hash2 TEXT, a REAL, b REAL, c REAL, d REAL, '
+            'PRIMARY KEY (statKey, hash1, hash2))'
+        )
+
+    @classmethod
+    def getStatKey(cls, statName, **params):
+        """
+        Creates a key for the statistic (or other method of comparison) and the parameters that affect the counts.
+        """
+        paramString = ';'.join([key + '=' + str(params[key]) for key in sorted(params)])
+        return cls.STORE_VERSION + ':' + statName + ':' + paramString
+
+    @classmethod
+    def getHash(cls, values):
+        """Content hash of a list of strings, for instance the rsids of a track."""
+        import hashlib
+        return hashlib.sha1('\n'.join(values)).hexdigest()
+
+    def getCounts(self, hashPairs):
+        """
+        Takes in a list of (hash1, hash2) pairs, and returns a dictionary with the stored counts of these pairs.
+        Pairs that are not stored are not part of the dictionary.
+
+        The pairs are inserted in a temporary table, which is joined with the stored pairs through the primary key,
+        so that the lookup does not depend on the number of pairs stored by other runs.
+        """
+        counts = {}
+        with self._connection:
+            self._connection.execute('CREATE TEMP TABLE IF NOT EXISTS wanted (hash1 TEXT, hash2 TEXT)')
+            self._connection.execute('DELETE FROM wanted')
+            self._connection.executemany('INSERT INTO wanted VALUES (?, ?)', set(hashPairs))
+            cursor = self._connection.execute(
+                'SELECT pairs.hash1, pairs.hash2, a, b, c, d FROM wanted CROSS JOIN pairs '
+                'ON pairs.statKey = ? AND pairs.hash1 = wanted.hash1 AND pairs.hash2 = wanted.hash2',
+                (self._statKey,)
+            )
+            for hash1, hash2, a, b, c, d in cursor:
+                counts[(hash1, hash2)] = {'a': a, 'b': b, 'c': c, 'd': d}
+            self._connection.execute('DELETE FROM wanted')
+
+        return counts
+
+    def addCounts(self, countDict):
+        """Stores counts, given as a dictionary with (hash1, hash2) keys and count dictionaries as values."""
+        rows = [
+            (self._statKey, hash1, hash2, float(count['a']), float(count['b']), float(count['c']), float(count['d']))
+            for (hash1, hash2), count in countDict.items()
+        ]
+        with self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO pairs VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,170 @@
+class TrackSnapshot(object):
+    """
+    On-disk, columnar snapshot of the preprocessed tracks of a GSuite, so that each track is only read through the
+    HyperBrowser once, rather than once for each pair of tracks, or once for each run of a tool.
+
+    For each track and chromosome (bin), the positions, values and rsids (snps column) of the track elements are
+    stored as NumPy files in the static files of the HyperBrowser, and memory-mapped when loaded. The snapshot of a
+    track is keyed by the name of the track, the bins and the modification time of the preprocessed track files, so
+    that a track that is preprocessed anew gets a new snapshot. Worker processes of the PairExecutor share the
+    memory-mapped arrays with the parent process.
+
+    The arrays of each track are returned as by TrackArraysStat, i.e. as a dictionary with chromosome names as keys,
+    where each value is a dictionary with the keys chr, start, length, starts, vals and snps.
+
+    Example usage:
+
+    trackArrays = TrackSnapshot.getTrackArrays(tracks, analysisBins)
+    for chromosome, arrays in trackArrays[0].items():
+        print chromosome, len(arrays['starts'])
+    """
+
+    SNAPSHOT_VERSION = '1'
+    ARRAY_KEYS = ['starts', 'vals', 'snps']
+
+    @classmethod
+    def getTrackArrays(cls, tracks, analysisBins):
+        """Returns the arrays of each track, creating the snapshot of tracks that have not been read before."""
+        return [cls._getSnapshot(track, analysisBins) for track in tracks]
+
+    @classmethod
+    def getTrackHash(cls, trackArrays):
+        """
+        Content hash of a track from its arrays, based on the positions, values and rsids (snps column) of each
+        chromosome. Two tracks with the same content get the same hash, regardless of their names, and the hash is
+        used to identify tracks in the PairResultStore.
+        """
+        import hashlib
+
+        trackHash = hashlib.sha1()
+        for chromosome in sorted(trackArrays):
+            arrays = trackArrays[chromosome]
+            chrHash = hashlib.sha1()
+            chrHash.update(arrays['starts'].tostring())
+            if arrays['vals'] is not None:
+                chrHash.update(arrays['vals'].tostring())
+            if arrays['snps'] is not None:
+                chrHash.update('\n'.join(arrays['snps']))
+            trackHash.update(chromosome + ':' + chrHash.hexdigest() + ';')
+
+        return trackHash.hexdigest()
+
+    @classmethod
+    def getTrackSize(cls, trackArrays):
+        """Number of track elements of a track, from its arrays."""
+        return sum(len(arrays['starts']) for arrays in trackArrays.values())
+
+    @classmethod
+    def getSnapshotKey(cls, track, analysisBins):
+        """
+        Key of the snapshot of a track, from the name of the track, the bins and the latest modification time of the
+        preprocessed files of the track.
+        """
+        import hashlib
+
+        bins = ';'.join('%s:%i-%i' % (region.chr, region.start, region.end) for region in analysisBins)
+        key = hashlib.sha1()
+        key.update('\n'.join([
+            cls.SNAPSHOT_VERSION,
+            ':'.join(track.trackName),
+            analysisBins.genome,
+            bins,
+            repr(cls._getModificationTime(track, analysisBins.genome))
+        ]))
+        return key.hexdigest()
+
+    @classmethod
+    def _getModificationTime(cls, track, genome):
+        """Latest modification time of the preprocessed files of a track, with and without overlaps."""
+        import os
+        from gold.util.CommonFunctions import createDirPath
+
+        modificationTime = 0
+        for allowOverlaps in [True, False]:
+            for dirPath, _, fileNames in os.walk(createDirPath(track.trackName, genome, allowOverlaps=allowOverlaps)):
+                for fileName in fileNames:
+                    modificationTime = max(modificationTime, os.path.getmtime(os.path.join(dirPath, fileName)))
+
+        return modificationTime
+
+    @classmethod
+    def _getSnapshot(cls, track, analysisBins):
+        import os
+        from quick.util.StaticFile import StaticFile
+
+        snapshotKey = cls.getSnapshotKey(track, analysisBins)
+        snapshotDir = StaticFile(['files', 'clustering_cache', 'snapshots', snapshotKey]).getDiskPath(True)
+        if not os.path.exists(snapshotDir):
+            from gold.application.HBAPI import doAnalysis, AnalysisSpec
+            from quick.statistic.TrackArraysStat import TrackArraysStat
+
+            trackArrays = doAnalysis(AnalysisSpec(TrackArraysStat), analysisBins, [track]).getGlobalResult()
+            cls._saveSnapshot(snapshotDir, trackArrays)
+
+        return cls._loadSnapshot(snapshotDir)
+
+    @classmethod
+    def _saveSnapshot(cls, snapshotDir, trackArrays):
+        """
+        Saves the arrays of each chromosome as NumPy files, along with an index of the chromosomes. The snapshot is
+        written to a temporary directory first, so that other runs never read a partly written snapshot.
+        """
+        import json
+        import os
+        import shutil
+        import tempfile
+        import numpy as np
+
+        tempDir = tempfile.mkdtemp(dir=os.path.dirname(snapshotDir))
+        try:
+            index = []
+            for chromosome in sorted(trackArrays):
+                arrays = trackArrays[chromosome]
+                chrIndex = {
+                    'chr': chromosome,
+                    'start': int(arrays['start']),
+                    'length': int(arrays['length']),
+                    'size': len(arrays['starts']),
+                    'files': {}
+                }
+                for key in cls.ARRAY_KEYS:
+                    if arrays.get(key) is not None:
+                        values = np.asarray(arrays[key])
+                        if key == 'snps':
+                            values = values.astype(str)
+                        fileName = '%i_%s.npy' % (len(index), key)
+                        np.save(os.path.join(tempDir, fileName), values)
+                        chrIndex['files'][key] = fileName
+                index.append(chrIndex)
+
+            with open(os.path.join(tempDir, 'index.json'), 'w') as indexFile:
+                json.dump(index, indexFile)
+            os.rename(tempDir, snapshotDir)
+        except OSError:
+            # Another run saved the same snapshot in the meantime
+            shutil.rmtree(tempDir, ignore_errors=True)
+            if not os.path.exists(snapshotDir):
+                raise
+
+    @classmethod
+    def _loadSnapshot(cls, snapshotDir):
+        import json
+        import os
+        import numpy as np
+
+        with open(os.path.join(snapshotDir, 'index.json')) as indexFile:
+            index = json.load(indexFile)
+
+        trackArrays = {}
+        for chrIndex in index:
+            chromosome = str(chrIndex['chr'])
+            arrays = {'chr': chromosome, 'start': chrIndex['start'], 'length': chrIndex['length']}
+            for key in cls.ARRAY_KEYS:
+                arrays[key] = None
+                if key in chrIndex['files']:
+                    # Empty arrays can not be memory-mapped
+                    mmapMode = 'r' if chrIndex['size'] > 0 else None
+                    arrays[key] = np.load(os.path.join(snapshotDir, chrIndex['files'][key]), mmap_mode=mmapMode)
+            trackArrays[chromosome] = arrays
+
+        return trackArrays
@@ -37,19 +37,108 @@ class DistanceMetricsBlockFoundationStatSplittable(DistanceMetricsFoundationStat
 
 class DistanceMetricsBlockFoundationStatUnsplittable(DistanceMetricsFoundationStatUnsplittable):
 
-    def _computeMatch(self, snp1, snp2, threshold):
-        a = 1
-        b = 0
-        c = 0
-        return a, b, c
+    @classmethod
+    def _computeMatches(cls, snps1, snps2, threshold):
+        """
+        Takes in arrays of matched SNPs, and returns arrays of the scores added to a, b and c for each match.
+        """
+        import numpy as np
+
+        ones = np.ones(len(snps1), dtype=np.int64)
+        zeros = np.zeros(len(snps1), dtype=np.int64)
+        return ones, zeros, zeros
 
     def _getDistances(self, snps1, snps2, region):
+        return self.countMatches(snps1, snps2, self._getThreshold())
+
+    @classmethod
+    def countMatches(cls, snps1, snps2, threshold):
+        """
+        Counts matches of two sorted lists of filtered SNPs of one bin (chromosome), where SNPs within threshold of
+        each other are matched, as by a two-pointer merge of the lists. Both lists are merged until one of them runs
+        out. The remaining SNPs of the other list within threshold of the last SNP of this list are then matched
+        with it, and the rest are counted as mismatches. Can be used directly by tools that match the same tracks
+        with several thresholds.
+
+        The neighbours of each SNP in the other list, i.e. the SNPs within threshold of it, are found with binary
+        search. A SNP without neighbours is never matched, and two SNPs that are the only neighbour of each other
+        are always matched with each other, so these are found for all SNPs at once. Only the SNPs with several
+        neighbours, or with a neighbour that has several, are merged one SNP at a time, see _merge.
+
+        The scores are summed in the order of the merge, so that the result is the same as summing them one at a
+        time. The step of the merge where a SNP is compared for the last time is the sum of the indexes of the SNPs
+        compared: a match is a step of both SNPs, and a mismatch is compared with the first SNP beyond its
+        neighbours in the other list.
+        """
+        import numpy as np
 
-        threshold = self._getThreshold()
+        snps1 = np.asarray(snps1)
+        snps2 = np.asarray(snps2)
+        snp1len = len(snps1)
+        snp2len = len(snps2)
 
-        a = 0
-        b = 0
-        c = 0
+        if snp1len == 0 or snp2len == 0:
+            return 0, snp1len, snp2len, -1
+
+        # Neighbours of each SNP in the other list, as the range [starts, ends) of indexes in that list
+        starts1 = np.searchsorted(snps2, snps1 - threshold, side='left')
+        ends1 = np.searchsorted(snps2, snps1 + threshold, side='right')
+        starts2 = np.searchsorted(snps1, snps2 - threshold, side='left')
+        ends2 = np.searchsorted(snps1, snps2 + threshold, side='right')
+
+        # Pairs of SNPs that are the only neighbour of each other
+        partners1 = np.minimum(starts1, snp2len - 1)
+        isPair1 = (ends1 - starts1 == 1) & (ends2[partners1] - starts2[partners1] == 1)
+        isPair2 = np.zeros(snp2len, dtype=bool)
+        isPair2[starts1[isPair1]] = True
+
+        # Matches among the other SNPs with neighbours
+        mergeIndexes1 = np.flatnonzero((ends1 > starts1) & ~isPair1)
+        mergeIndexes2 = np.flatnonzero((ends2 > starts2) & ~isPair2)
+        mergeMatches1, mergeMatches2 = cls._merge(snps1[mergeIndexes1].tolist(), snps2[mergeIndexes2].tolist(),
+                                                  threshold)
+        matches1 = np.concatenate([np.flatnonzero(isPair1), mergeIndexes1[mergeMatches1]])
+        matches2 = np.concatenate([starts1[isPair1], mergeIndexes2[mergeMatches2]])
+        matchKeys = matches1 + matches2
+
+        # Step of the merge of each SNP, where the merge ends when the last SNP of one of the lists is compared
+        keys1 = np.arange(snp1len) + ends1
+        keys2 = np.arange(snp2len) + ends2
+        keys1[matches1] = matchKeys
+        keys2[matches2] = matchKeys
+        endKey = min(keys1[-1], keys2[-1])
+        remaining1 = np.flatnonzero(keys1 > endKey)
+        remaining2 = np.flatnonzero(keys2 > endKey)
+
+        endMatches1 = cls._getEndMatches(snps1, remaining1, snps2[-1], threshold)
+        endMatches2 = cls._getEndMatches(snps2, remaining2, snps1[-1], threshold)
+        matches1 = np.concatenate([matches1, endMatches1, np.repeat(snp1len - 1, len(endMatches2))])
+        matches2 = np.concatenate([matches2, np.repeat(snp2len - 1, len(endMatches1)), endMatches2])
+        matchKeys = np.concatenate([matchKeys, snp1len + snp2len + np.arange(len(endMatches1) + len(endMatches2))])
+
+        isMismatch1 = keys1 <= endKey
+        isMismatch1[matches1] = False
+        isMismatch2 = keys2 <= endKey
+        isMismatch2[matches2] = False
+
+        aMatch, bMatch, cMatch = cls._computeMatches(snps1[matches1], snps2[matches2], threshold)
+        a = cls._sumInOrder(aMatch, matchKeys)
+        b = cls._sumInOrder(np.concatenate([bMatch, np.ones(isMismatch1.sum(), dtype=bMatch.dtype)]),
+                            np.concatenate([matchKeys, keys1[isMismatch1]]))
+        c = cls._sumInOrder(np.concatenate([cMatch, np.ones(isMismatch2.sum(), dtype=cMatch.dtype)]),
+                            np.concatenate([matchKeys, keys2[isMismatch2]]))
+        leftOver1 = len(remaining1) - len(endMatches1)
+        leftOver2 = len(remaining2) - len(endMatches2)
+        return a, b + leftOver1, c + leftOver2, -1
+
+    @classmethod
+    def _merge(cls, snps1, snps2, threshold):
+        """
+        Two-pointer merge of two lists of SNPs, until one of them runs out. Returns the indexes of the matched SNPs
+        in both lists.
+        """
+        matches1 = []
+        matches2 = []
         snp1len = len(snps1)
         snp2len = len(snps2)
 
@@ -60,44 +149,37 @@ class DistanceMetricsBlockFoundationStatUnsplittable(DistanceMetricsFoundationSt
             snp2 = snps2[j]
 
             if abs(snp1 - snp2) <= threshold:
-                a_val, b_val, c_val = self._computeMatch(snp1, snp2, threshold)
-                a += a_val
-                b += b_val
-                c += c_val
-
+                matches1.append(i)
+                matches2.append(j)
                 i += 1
                 j += 1
 
             elif snp1 < snp2:
-                b += 1
                 i += 1
             elif snp1 > snp2:
-                c += 1
                 j += 1
 
-        if i < snp1len and snp2len == 0:
-            b += snp1len
-        elif snp1len == 0 and j < snp2len:
-            c += snp2len
-        elif i < snp1len and snp2len != 0:
-            snp = snps2[j - 1]
-            while i < snp1len and abs(snp - snps1[i]) <= threshold:
-                a_val, b_val, c_val = self._computeMatch(snps1[i], snp, threshold)
-                a += a_val
-                b += b_val
-                c += c_val
-                i += 1
-            b += snp1len - i
-        elif j < snp2len and snp1len != 0:
-            snp = snps1[i - 1]
-            while j < snp2len and abs(snp - snps2[j]) <= threshold:
-                a_val, b_val, c_val = self._computeMatch(snps2[j], snp, threshold)
-                a += a_val
-                b += b_val
-                c += c_val
-                j += 1
-            c += snp2len - j
-        return a, b, c, -1
+        return matches1, matches2
+
+    @classmethod
+    def _getEndMatches(cls, snps, remaining, lastSnp, threshold):
+        """
+        Indexes of the remaining SNPs of a list, after the other list has run out, that are matched with the last SNP
+        of the other list: those within threshold of it, up to the first SNP that is not.
+        """
+        import numpy as np
+
+        isWithin = np.abs(snps[remaining] - lastSnp) <= threshold
+        return remaining[:int(np.cumprod(isWithin).sum())]
+
+    @classmethod
+    def _sumInOrder(cls, values, keys):
+        """Sum of the values, added one at a time in order of the keys, or 0 if there are no values."""
+        import numpy as np
+
+        if len(values) == 0:
+            return 0
+        return np.cumsum(values[np.argsort(keys, kind='mergesort')])[-1].item()
 
     def _getThreshold(self):
         """
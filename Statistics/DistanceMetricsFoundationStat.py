@@ -24,7 +24,8 @@ class DistanceMetricsFoundationStat(MagicStatFactory):
     c: Mismatches (0, 1)
     d: Negative matches
 
-    See example of usage in quick/webtools/clustering/BinaryClusteringTool.py
+    To count all pairs of tracks in a GSuite, DistanceMetricsMultiTrackStat gives the same counts in one traversal
+    of the genome.
 
     Two subclasses exist, which build on the implementation below:
     - DistanceMetricsBlockFoundationStat
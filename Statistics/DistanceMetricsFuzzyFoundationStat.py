@@ -40,23 +40,32 @@ class DistanceMetricsFuzzyFoundationStatSplittable(DistanceMetricsBlockFoundatio
 
 class DistanceMetricsFuzzyFoundationStatUnsplittable(DistanceMetricsBlockFoundationStatUnsplittable):
 
-    def _computeMatch(self, snp1, snp2, threshold):
+    @classmethod
+    def _computeMatches(cls, snps1, snps2, threshold):
         """
+        Takes in arrays of matched SNPs, and returns arrays of the scores added to a, b and c for each match, where
+        SNPs at the same position count as a full match.
+
         The threshold is half the genetic loci used in filtering. It behaves much like the one in the block definition,
         but for computing a fuzzy positive match, it is split in half again.
         The curve fits somewhat a model of LD decay, with respect to physical distance, when the sigma of the
         function (below: bell_width) is set to a quarter of the full genetic loci range.
-        """
-        if snp1 == snp2:
-            return 1, 0, 0
 
+        The weights are computed with math.exp, one at a time, rather than with np.exp, which may differ from it in
+        the last bit, so that the scores are exactly those of the original computation.
+        """
         from math import exp
+        import numpy as np
+
         bell_width = threshold / 2.0
-        snp1 = float(snp1)
-        snp2 = float(snp2)
-        numerator = (snp2 - snp1) ** 2
+        snps1 = np.asarray(snps1, dtype=np.float64)
+        snps2 = np.asarray(snps2, dtype=np.float64)
+        numerator = (snps2 - snps1) ** 2
         denominator = 2 * bell_width ** 2
-        a = exp(- (numerator / denominator))
-        b = (1 - a) / 2
-        c = (1 - a) / 2
+
+        samePosition = snps1 == snps2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = np.where(samePosition, 1.0, np.frompyfunc(exp, 1, 1)(- (numerator / denominator)).astype(np.float64))
+        b = np.where(samePosition, 0.0, (1 - a) / 2)
+        c = b.copy()
         return a, b, c
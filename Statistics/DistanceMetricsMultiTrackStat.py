@@ -0,0 +1,92 @@
+from gold.statistic.MagicStatFactory import MagicStatFactory
+from gold.statistic.RawDataStat import RawDataStat
+from gold.statistic.Statistic import StatisticSplittable, MultipleTrackStatistic
+from gold.track.TrackFormat import TrackFormatReq
+
+
+class DistanceMetricsMultiTrackStat(MagicStatFactory):
+    """
+    Statistic which calculates positive matches (1, 1), negative matches (0, 0) and mismatches (0, 1) or (1, 0)
+    between all pairs of the given tracks, in one traversal of the genome. Is made for valued point tracks, and
+    return a genome-wide count for each pair.
+
+    Gives the same counts as DistanceMetricsFoundationStat does for one pair, where each count represents a base
+    pair in the tracks. Rather than reading both tracks once for every pair, each track is read once per chromosome,
+    and the positions of all tracks are stored in a sparse track x position incidence matrix X. The positive matches
+    for all pairs are then found by the product X * X^T.
+
+    Returns a dictionary of numpy arrays, where each array have one element for each pair (i, j), i < j, in the same
+    order as a triangular (condensed) distance matrix. The dictionary have the following keys:
+    a: Positive matches
+    b: Mismatches (1, 0)
+    c: Mismatches (0, 1)
+    d: Negative matches
+
+    See example of usage in quick/webtools/clustering/BinaryClusteringTool.py
+    """
+    pass
+
+
+class DistanceMetricsMultiTrackStatSplittable(StatisticSplittable):
+
+    def _combineResults(self):
+        """
+        Sums the intersection matrix, track sizes and chromosome sizes of all chromosomes, and finds the
+        matches for each pair of tracks.
+        """
+        import numpy as np
+
+        intersections = 0
+        sizes = 0
+        totalBpSpan = 0
+        for child in self._childResults:
+            if child:
+                intersections = intersections + child[0]
+                sizes = sizes + child[1]
+                totalBpSpan += child[2]
+
+        rows, cols = np.triu_indices(len(sizes), 1)
+        a = intersections[rows, cols]
+        b = sizes[rows] - a
+        c = sizes[cols] - a
+        d = totalBpSpan - a - b - c
+
+        return {'a': a, 'b': b, 'c': c, 'd': d}
+
+
+class DistanceMetricsMultiTrackStatUnsplittable(MultipleTrackStatistic):
+
+    @classmethod
+    def _getIntersections(cls, positionsList):
+        """
+        Takes in a list of position arrays, one for each track, and returns a square matrix with the number of
+        positions shared by each pair of tracks, along with the number of unique positions of each track.
+        """
+        import numpy as np
+        from scipy.sparse import csr_matrix
+
+        positionsList = [np.unique(positions) for positions in positionsList]
+        sizes = np.array([len(positions) for positions in positionsList], dtype=np.int64)
+
+        allPositions, columns = np.unique(np.concatenate(positionsList), return_inverse=True)
+        rows = np.repeat(np.arange(len(positionsList)), sizes)
+        incidence = csr_matrix(
+            (np.ones(len(columns), dtype=np.int64), (rows, columns)),
+            shape=(len(positionsList), len(allPositions))
+        )
+
+        intersections = incidence.dot(incidence.T).toarray()
+        return intersections, sizes
+
+    def _compute(self):
+        """
+        For each bin (chromosome), get the positions of all tracks and count positions shared by each pair of tracks.
+        Pass these, along with the track sizes and size of the chromosome, to the Splittable class.
+        """
+        positionsList = [child.getResult().startsAsNumpyArray() for child in self._children]
+        intersections, sizes = self._getIntersections(positionsList)
+        return intersections, sizes, self._region.getTotalBpSpan()
+
+    def _createChildren(self):
+        for track in self._tracks:
+            self._addChild(RawDataStat(self._region, track, TrackFormatReq(allowOverlaps=False)))
@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+
 from gold.statistic.MagicStatFactory import MagicStatFactory
 from gold.statistic.Statistic import Statistic
 from gold.statistic.RawDataStat import RawDataStat
@@ -25,45 +27,104 @@ class FilterSNPStatUnsplittable(Statistic):
     A SNP is defined as a valued point in the track
     1) For each SNP, check if there are other SNPs within the genetic locus threshold passed to class.
     2) If there are several within genetic locus threshold, only keep most significant, i.e SNP with lowest p-value
+
+    As each track is compared with all other tracks in a clustering run, tools can cache the filtered SNPs for each
+    track, bin and threshold during a run, so that each track is only filtered once, see cachedFiltering.
     """
 
+    # Filtered SNPs by the key of _getCacheKey, or None when filtered SNPs are not cached
+    _filteredSNPCache = None
+
     def _init(self, filterThreshold=0):
         self._filterThreshold = int(filterThreshold)
 
-    def _keepSNP(self, snps, pval, notNanIndexes, indexList):
+    @classmethod
+    @contextmanager
+    def cachedFiltering(cls):
+        """
+        Context, typically a clustering run, where the filtered SNPs are cached, so that a track compared with many
+        other tracks is only filtered once. The cache is removed when the context is left, so that tracks that are
+        preprocessed again are filtered anew in later runs. Outside the context, the SNPs are filtered each time.
+        """
+        if cls._filteredSNPCache is not None:
+            yield
+            return
+
+        cls._filteredSNPCache = {}
+        try:
+            yield
+        finally:
+            cls._filteredSNPCache = None
+
+    @classmethod
+    def _isCached(cls, cacheKey):
+        return cls._filteredSNPCache is not None and cacheKey in cls._filteredSNPCache
+
+    def _getCacheKey(self):
+        return (
+            tuple(self._track.trackName),
+            self._region.chr,
+            self._region.start,
+            self._region.end,
+            self._filterThreshold
+        )
+
+    @classmethod
+    def _getLocusStarts(cls, snps, filterThreshold):
+        """
+        Index of the first SNP of each genetic locus. A locus starts at a SNP, and holds all following SNPs within
+        filterThreshold of that first SNP, so the next locus starts at the first SNP beyond this range.
+        """
+        import numpy as np
+
+        nextStarts = np.searchsorted(snps, snps + filterThreshold, side='right')
+        locusStarts = []
+        start = 0
+        while start < len(snps):
+            locusStarts.append(start)
+            start = nextStarts[start]
 
-        filterIndexes = notNanIndexes[indexList]
-        notNanArray = pval[indexList][filterIndexes]
-        maxPVal = max(notNanArray)
-        index = list(pval[indexList]).index(maxPVal)    # Uses max of p-val, as we assume a -log(pval) transformation
-        return snps[indexList][index]
+        return np.array(locusStarts, dtype=np.intp)
 
     def filterSNP(self, snps, pval):
+        return self.filterSNPs(snps, pval, self._filterThreshold)
 
-        import numpy as np
-        filterThreshold = self._filterThreshold
+    @classmethod
+    def filterTrack(cls, snps, pval, filterThreshold):
+        """
+        Returns the filtered SNPs of one bin (chromosome), as computed by the statistic. Can be used directly by
+        tools that filter the same track with several thresholds.
+        """
+        if len(snps) > 1:
+            return cls.filterSNPs(snps, pval, filterThreshold)
+        else:
+            return list(snps)
 
-        SNPcount = len(snps)
-        notNanIndexes = ~np.isnan(pval)
+    @classmethod
+    def filterSNPs(cls, snps, pval, filterThreshold):
+        """
+        Keeps the most significant SNP of each genetic locus, i.e. the SNP with the max value, as we assume a
+        -log(pval) transformation. NaN values are ignored, and the first SNP is kept if several SNPs share the max
+        value. If all values of a locus are NaN, the first SNP of the locus is kept.
+        """
+        import numpy as np
 
-        filtered = []
-        locusList = [0]
-        i = 1
-        while i < SNPcount:
-            prevSNP = snps[i - 1]
-            currSNP = snps[i]
-            lowerLocusLimit = snps[locusList[0]]
+        locusStarts = cls._getLocusStarts(snps, filterThreshold)
+        locusIds = np.zeros(len(snps), dtype=np.intp)
+        locusIds[locusStarts[1:]] = 1
+        locusIds = np.cumsum(locusIds)
 
-            if currSNP - lowerLocusLimit > filterThreshold:
-                filtered.append(self._keepSNP(snps, pval, notNanIndexes, np.asarray(locusList)))
-                locusList = [i]
-            elif currSNP - prevSNP <= filterThreshold:
-                locusList.append(i)
+        notNan = ~np.isnan(pval)
+        values = np.where(notNan, pval, -np.inf)
+        maxValues = np.maximum.reduceat(values, locusStarts)
 
-            i += 1
+        isMax = notNan & (values == maxValues[locusIds])
+        candidates = np.where(isMax, np.arange(len(snps)), len(snps))
+        keepIndexes = np.minimum.reduceat(candidates, locusStarts)
 
-        filtered.append(self._keepSNP(snps, pval, notNanIndexes, np.asarray(locusList)))
-        return filtered
+        allNan = keepIndexes == len(snps)
+        keepIndexes[allNan] = locusStarts[allNan]
+        return snps[keepIndexes]
 
     def _compute(self):
         """
@@ -72,14 +133,19 @@ class FilterSNPStatUnsplittable(Statistic):
 
         Returns a filtered list of SNPs for the given chromosome region
         """
+        cacheKey = self._getCacheKey()
+        if self._isCached(cacheKey):
+            return self._filteredSNPCache[cacheKey]
+
         rawData = self._children[0].getResult()
         snps = rawData.startsAsNumpyArray()
         pval = rawData.valsAsNumpyArray()
 
-        if len(snps) > 1:
-            return self.filterSNP(snps, pval)
-        else:
-            return list(snps)
+        filtered = self.filterTrack(snps, pval, self._filterThreshold)
+        if self._filteredSNPCache is not None:
+            self._filteredSNPCache[cacheKey] = filtered
+        return filtered
 
     def _createChildren(self):
-        self._addChild(RawDataStat(self._region, self._track, TrackFormatReq(allowOverlaps=True)))
+        if not self._isCached(self._getCacheKey()):
+            self._addChild(RawDataStat(self._region, self._track, TrackFormatReq(allowOverlaps=True)))
@@ -0,0 +1,130 @@
+from gold.statistic.MagicStatFactory import MagicStatFactory
+from gold.statistic.Statistic import StatisticSplittable, MultipleTrackStatistic
+from quick.statistic.FilterSNPStat import FilterSNPStat
+from quick.statistic.GeneticLociOverlapStat import GeneticLociOverlapStatUnsplittable
+
+
+class GeneticLociOverlapMultiTrackStat(MagicStatFactory):
+    """
+    Calculate sum of overlapping genetic loci between all pairs of the given tracks, in one traversal of the genome.
+
+    Gives the same counts as GeneticLociOverlapStat does for one pair, where the tracks are filtered to only contain
+    the most significant SNP of each genetic locus, and SNPs within half the threshold of each other overlap. Rather
+    than filtering both tracks once for every pair, each track is filtered once per chromosome, and the overlaps of
+    all pairs are found from the merged, sorted loci of all tracks.
+
+    Returns a square numpy array with the count of overlaps for each pair of tracks, summed over all chromosomes.
+    The diagonal holds the number of loci of each track, i.e. the overlap of a track with itself.
+
+    See example of usage in quick/webtools/clustering/OverlapCorrelationClusteringTool.py
+    """
+    pass
+
+
+class GeneticLociOverlapMultiTrackStatSplittable(StatisticSplittable):
+
+    def _combineResults(self):
+        overlaps = 0
+        for child in self._childResults:
+            overlaps = overlaps + child
+
+        return overlaps
+
+
+class GeneticLociOverlapMultiTrackStatUnsplittable(MultipleTrackStatistic):
+
+    @classmethod
+    def countOverlapMatrix(cls, lociList, threshold):
+        """
+        Takes in a list of sorted, filtered SNPs, one for each track, and returns a square matrix of the overlaps of
+        each pair of tracks.
+
+        The loci of all tracks are merged and sorted, and all pairs of loci of different tracks within threshold of
+        each other are found. For a pair of tracks, loci without such a neighbour in the other track never overlap.
+        If no locus has more than one neighbour in the other track, each neighbour pair is an overlap, and these
+        are counted for all pairs of tracks at once. Loci with several neighbours are counted with the two-pointer
+        merge of GeneticLociOverlapStat, on these loci only.
+        """
+        import numpy as np
+
+        trackCount = len(lociList)
+        lociList = [np.asarray(loci, dtype=np.int64) for loci in lociList]
+        sizes = np.array([len(loci) for loci in lociList], dtype=np.int64)
+        overlaps = np.diag(sizes)
+        if sizes.sum() == 0:
+            return overlaps
+
+        # Loci of all tracks in sorted order, with the track and index (in all loci) of each locus
+        allLoci = np.concatenate(lociList)
+        tracks = np.repeat(np.arange(trackCount), sizes)
+        order = np.argsort(allLoci, kind='mergesort')
+        sortedLoci = allLoci[order]
+
+        # All pairs of loci within threshold of each other, as (first, second) in sorted order
+        ends = np.searchsorted(sortedLoci, sortedLoci + threshold, side='right')
+        neighbourCounts = ends - np.arange(len(sortedLoci)) - 1
+        first = np.repeat(np.arange(len(sortedLoci)), neighbourCounts)
+        pairStarts = np.cumsum(neighbourCounts) - neighbourCounts
+        second = first + 1 + np.arange(len(first)) - np.repeat(pairStarts, neighbourCounts)
+        first = order[first]
+        second = order[second]
+
+        otherTrack = tracks[first] != tracks[second]
+        first = first[otherTrack]
+        second = second[otherTrack]
+        loci1 = np.where(tracks[first] < tracks[second], first, second)
+        loci2 = np.where(tracks[first] < tracks[second], second, first)
+        trackPairs = tracks[loci1] * trackCount + tracks[loci2]
+
+        # Number of neighbours of each locus, in the other track of the pair
+        trackLength = allLoci.max() + 2 * threshold + 1
+        trackLoci = tracks * trackLength + allLoci
+        neighbours1 = cls._countNeighbours(trackLoci, tracks[loci2] * trackLength + allLoci[loci1], threshold)
+        neighbours2 = cls._countNeighbours(trackLoci, tracks[loci1] * trackLength + allLoci[loci2], threshold)
+        isSingle = (neighbours1 == 1) & (neighbours2 == 1)
+
+        pairOverlaps = np.bincount(trackPairs[isSingle], minlength=trackCount * trackCount)
+
+        # Loci of each remaining pair of tracks, as trackPair * lociCount + index in all loci
+        lociCount = len(allLoci)
+        merged = ~isSingle
+        mergedLoci1 = np.unique(trackPairs[merged] * lociCount + loci1[merged])
+        mergedLoci2 = np.unique(trackPairs[merged] * lociCount + loci2[merged])
+        mergedPairs = np.unique(mergedLoci1 // lociCount)
+        bounds1 = np.searchsorted(mergedLoci1 // lociCount, np.append(mergedPairs, trackCount * trackCount))
+        bounds2 = np.searchsorted(mergedLoci2 // lociCount, np.append(mergedPairs, trackCount * trackCount))
+        for index, trackPair in enumerate(mergedPairs.tolist()):
+            pairLoci1 = allLoci[mergedLoci1[bounds1[index]:bounds1[index + 1]] % lociCount]
+            pairLoci2 = allLoci[mergedLoci2[bounds2[index]:bounds2[index + 1]] % lociCount]
+            pairOverlaps[trackPair] += GeneticLociOverlapStatUnsplittable.countOverlappingLoci(
+                pairLoci1.tolist(), pairLoci2.tolist(), threshold
+            )
+
+        pairOverlaps = pairOverlaps.reshape(trackCount, trackCount)
+        return overlaps + pairOverlaps + pairOverlaps.T
+
+    @classmethod
+    def _countNeighbours(cls, trackLoci, loci, threshold):
+        """
+        Number of loci within threshold of each of the given loci, where the loci of all tracks are given as
+        track * trackLength + position, in sorted order.
+        """
+        import numpy as np
+
+        return np.searchsorted(trackLoci, loci + threshold, side='right') - \
+            np.searchsorted(trackLoci, loci - threshold, side='left')
+
+    def _getGeneticLociThreshold(self):
+        threshold = 0
+        if 'filterThreshold' in self._kwArgs:
+            threshold = int(self._kwArgs['filterThreshold']) / 2
+
+        return threshold
+
+    def _compute(self):
+        lociList = [child.getResult() for child in self._children]
+        return self.countOverlapMatrix(lociList, self._getGeneticLociThreshold())
+
+    def _createChildren(self):
+        for track in self._tracks:
+            self._addChild(FilterSNPStat(self._region, track, filterThreshold=self._getGeneticLociThreshold() * 2))
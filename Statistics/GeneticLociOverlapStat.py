@@ -13,6 +13,8 @@ class GeneticLociOverlapStat(MagicStatFactory):
     The overlap is then computed for half the threshold, so that all SNPs can only overlap with one locus at the other
     track.
     Count of overlaps, summed over all chromosomes, are returned.
+
+    To find the overlap of all pairs of tracks in a GSuite, use GeneticLociOverlapMultiTrackStat.
     """
     pass
 
@@ -23,12 +25,15 @@ class GeneticLociOverlapStatSplittable(StatisticSumResSplittable):
 
 class GeneticLociOverlapStatUnsplittable(Statistic):
 
-    def _countOverlappingLoci(self, snps1, snps2):
-
+    @classmethod
+    def countOverlappingLoci(cls, snps1, snps2, threshold):
+        """
+        Counts overlapping loci of two sorted lists of filtered SNPs, where SNPs within threshold of each other overlap.
+        Used directly by GeneticLociOverlapMultiTrackStat, for pairs of tracks that can not be counted all at once.
+        """
         if len(snps1) == 0 or len(snps2) == 0:
             return 0
 
-        threshold = self._getGeneticLociThreshold()
         count = 0
         i, j = (0, 0)
         while i < len(snps1) and j < len(snps2):
@@ -57,7 +62,7 @@ class GeneticLociOverlapStatUnsplittable(Statistic):
     def _compute(self):
         snps1 = self._children[0].getResult()
         snps2 = self._children[1].getResult()
-        return self._countOverlappingLoci(snps1, snps2)
+        return self.countOverlappingLoci(snps1, snps2, self._getGeneticLociThreshold())
 
     def _createChildren(self):
 
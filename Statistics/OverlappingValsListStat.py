@@ -3,12 +3,11 @@ from gold.statistic.MagicStatFactory import MagicStatFactory
 from gold.statistic.Statistic import Statistic, StatisticSplittable
 from gold.statistic.RawDataStat import RawDataStat
 from gold.track.TrackFormat import TrackFormatReq
-from math import isinf
 
 
 class OverlappingValsListStat(MagicStatFactory):
     """
-    Return two lists containing values, one for each track.
+    Return two vectors (numpy arrays) containing values, one for each track.
     The features of the vectors represent positions where both tracks have a SNP.
     """
     pass
@@ -20,22 +19,21 @@ class OverlappingValsListStatSplittable(StatisticSplittable):
     """
 
     def _combineResults(self):
+        import numpy as np
 
-        pvalsX = []
-        pvalsY = []
+        pvalsX = [child[0] for child in self._childResults]
+        pvalsY = [child[1] for child in self._childResults]
 
-        for child in self._childResults:
-            pvalsX += child[0]
-            pvalsY += child[1]
-
-        return {'X': pvalsX, 'Y': pvalsY}
+        return {'X': np.concatenate(pvalsX + [np.zeros(0)]), 'Y': np.concatenate(pvalsY + [np.zeros(0)])}
 
 
 class OverlappingValsListStatUnsplittable(Statistic):
     """
-    For each region, finds all positions present in both tracks, and store the lowest values of the track position,
-    one for each track. Returns two vectors with values for all such overlapping positions in the corresponding
-    track.
+    For each region, finds all positions present in both tracks, and store the highest values of the track position,
+    one for each track. Returns two vectors (numpy arrays) with values for all such overlapping positions in the
+    corresponding track, in order of position. Positions where a pair of matched SNPs (see _getMatchedSnps) both have
+    infinite values are left out, as a merge of the tracks can not pass such a pair. Other positions where the values
+    of both tracks are infinite are kept, with infinite values.
     """
 
     def _compute(self):
@@ -43,118 +41,88 @@ class OverlappingValsListStatUnsplittable(Statistic):
         track1 = self._children[0].getResult()
         track2 = self._children[1].getResult()
 
-        positions1 = track1.startsAsNumpyArray()
-        positions2 = track2.startsAsNumpyArray()
-        track1Length = track1.getNumElements()
-        track2Length = track2.getNumElements()
-
-        if track1Length == 0 or track2Length == 0:
-            return [], []
-
-        pvals1 = track1.valsAsNumpyArray()
-        pvals2 = track2.valsAsNumpyArray()
-
-        pvalsX = {}
-        pvalsY = {}
-
-        i, j = (0, 0)
-
-        while i < track1Length and j < track2Length:
-
-            pos1 = positions1[i]
-            pos2 = positions2[j]
-            pval1 = pvals1[i]
-            pval2 = pvals2[j]
-
-            if self._isSamePosition(pos1, pos2) and self._notInfinity(pval1, pval2):
-                self._appendValue(pos1, pval1, pvalsX)
-                self._appendValue(pos2, pval2, pvalsY)
-                i += 1
-                j += 1
-            elif pos1 < pos2:
-                self._updateIfPresent(pos1, pval1, pvalsX)
-                i += 1
-            elif pos2 < pos1:
-                self._updateIfPresent(pos2, pval2, pvalsY)
-                j += 1
-
-        # If any values remain in the longer list that have the same position as the last match
-        if i == track1Length and j < track2Length:
-            pos1 = positions1[i - 1]
-            while j < track2Length:
-                pos2 = positions2[j]
-                if pos2 != pos1:
-                    break
-
-                pval2 = pvals2[j]
-                self._updateIfPresent(pos2, pval2, pvalsY)
-                j += 1
-        elif j == track2Length and i < track1Length:
-            pos2 = positions2[j - 1]
-            while i < track1Length:
-                pos1 = positions1[i]
-                if pos2 != pos1:
-                    break
-
-                pval1 = pvals1[i]
-                self._updateIfPresent(pos1, pval1, pvalsX)
-                i += 1
-
-        return self._dictToVector(pvalsX), self._dictToVector(pvalsY)
-
-    def _notInfinity(self, pval1, pval2):
-        return not isinf(pval1) or not isinf(pval2)
-
-    def _isSamePosition(self, pos1, pos2):
-        return pos1 == pos2
-
-    def _appendValue(self, pos, value, valueDict):
-        """
-        I the children are created with allowOverlaps=False, SNPs that have several P-values (reported in different
-        studies) will get a value of nan. This is common for tracks generated from the GWAS Catalog via the
-        HyperBrowser.
+        return self.getOverlappingValues(
+            track1.startsAsNumpyArray(), track1.valsAsNumpyArray(),
+            track2.startsAsNumpyArray(), track2.valsAsNumpyArray()
+        )
 
-        To in stead get the most significant value of these positions, while at the same time not creating multiple
-        features for the same position, a dictionary store all vector features for each track.
+    @classmethod
+    def getOverlappingValues(cls, positions1, pvals1, positions2, pvals2):
         """
-        if pos in valueDict:
-            self._updateValue(pos, value, valueDict)
-        else:
-            valueDict[pos] = value
-
-    def _updateValue(self, pos, val, valueDict):
+        Values of both tracks at the positions present in both tracks, as two numpy arrays sorted on position.
         """
-        Called to update value, when position is key in dictionary.
-        Values of -log(pval) are assumed, and the most significant SNP of the two is defined as the one with
-        the highest value.
+        import numpy as np
+
+        if len(positions1) == 0 or len(positions2) == 0:
+            return np.zeros(0), np.zeros(0)
+
+        positions1, pvals1 = cls._sortOnPosition(positions1, pvals1)
+        positions2, pvals2 = cls._sortOnPosition(positions2, pvals2)
+        uniquePositions1, starts1, counts1 = np.unique(positions1, return_index=True, return_counts=True)
+        uniquePositions2, starts2, counts2 = np.unique(positions2, return_index=True, return_counts=True)
+
+        shared, indexes1, indexes2 = np.intersect1d(
+            uniquePositions1, uniquePositions2, assume_unique=True, return_indices=True
+        )
+        otherCounts1 = np.zeros(len(uniquePositions1), dtype=counts2.dtype)
+        otherCounts1[indexes1] = counts2[indexes2]
+        otherCounts2 = np.zeros(len(uniquePositions2), dtype=counts1.dtype)
+        otherCounts2[indexes2] = counts1[indexes1]
+
+        groupIds1, matched1 = cls._getMatchedSnps(starts1, counts1, otherCounts1)
+        groupIds2, matched2 = cls._getMatchedSnps(starts2, counts2, otherCounts2)
+        pvalsX = cls._getPositionValues(pvals1, starts1, matched1)[indexes1]
+        pvalsY = cls._getPositionValues(pvals2, starts2, matched2)[indexes2]
+
+        # The matched SNPs of both tracks are paired in order. A merge can not pass a pair where both values are
+        # infinite, so the positions of such pairs are left out.
+        infinitePairs = np.isinf(pvals1[matched1]) & np.isinf(pvals2[matched2])
+        hasInfinitePair = np.zeros(len(uniquePositions1), dtype=bool)
+        hasInfinitePair[groupIds1[matched1][infinitePairs]] = True
+        isKept = ~hasInfinitePair[indexes1]
+        return pvalsX[isKept], pvalsY[isKept]
+
+    @classmethod
+    def _getMatchedSnps(cls, starts, counts, otherCounts):
         """
-        value = valueDict[pos]
+        Takes in the start and count of the SNPs of each unique position of a track, in sorted order, along with the
+        number of SNPs of the other track at the same position (otherCounts). As in a merge of the two tracks, the
+        SNPs of a position are matched pairwise, in order, with the SNPs of the other track at the same position.
+        Returns the index of the unique position of each SNP, and whether each SNP is matched.
+        """
+        import numpy as np
 
-        if val > value:
-            valueDict[pos] = val
+        groupIds = np.repeat(np.arange(len(starts)), counts)
+        isMatched = np.arange(len(groupIds)) - starts[groupIds] < otherCounts[groupIds]
+        return groupIds, isMatched
 
-    def _updateIfPresent(self, pos, val, valueDict):
-        """
-        Check to see if the value maps to a feature that is stored for the track vector.
-        If it is, and the new value has higher significance (lower value), the new value replace the old.
-        """
-        if isinf(val):
-            return
+    @classmethod
+    def _sortOnPosition(cls, positions, pvals):
+        import numpy as np
 
-        if pos in valueDict:
-            self._updateValue(pos, val, valueDict)
+        order = np.argsort(positions, kind='mergesort')
+        return positions[order], np.asarray(pvals, dtype=np.float64)[order]
 
-    def _dictToVector(self, valueDict):
+    @classmethod
+    def _getPositionValues(cls, pvals, starts, isMatched):
         """
-        Return vector of unique positions, in sorted order
+        The children are created with allowOverlaps=True, as SNPs that have several P-values (reported in different
+        studies) would otherwise get a value of nan. This is common for tracks generated from the GWAS Catalog via
+        the HyperBrowser.
+
+        To in stead get the most significant value of these positions, while at the same time not creating multiple
+        features for the same position, the values are reduced to one value for each unique position, starting at
+        starts. Values of -log(pval) are assumed, and the most significant SNP is defined as the one with the highest
+        value. Infinite values are only used for SNPs matched with a SNP of the other track (see _getMatchedSnps),
+        and the value of the position is NaN if the value of its first SNP is NaN.
         """
-        sortedPositions = sorted(valueDict.keys())
-        sortedValues = [valueDict[key] for key in sortedPositions]
-        return sortedValues
+        import numpy as np
+
+        values = np.fmax.reduceat(np.where(isMatched | ~np.isinf(pvals), pvals, np.nan), starts)
+        values[np.isnan(pvals[starts])] = np.nan
+
+        return values
 
     def _createChildren(self):
         self._addChild(RawDataStat(self._region, self._track, TrackFormatReq(allowOverlaps=True)))
         self._addChild(RawDataStat(self._region, self._track2, TrackFormatReq(allowOverlaps=True)))
-
-
-
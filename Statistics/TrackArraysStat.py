@@ -0,0 +1,50 @@
+from gold.statistic.MagicStatFactory import MagicStatFactory
+from gold.statistic.RawDataStat import RawDataStat
+from gold.statistic.Statistic import Statistic, StatisticSplittable
+from gold.track.TrackFormat import TrackFormatReq
+
+
+class TrackArraysStat(MagicStatFactory):
+    """
+    Returns the track elements of a point track as numpy arrays, for each chromosome.
+
+    Used by tools that process the same track several times, for instance with different parameters, so that the
+    track only has to be read once. Returns a dictionary with chromosome names as keys, where each value is a
+    dictionary with the following keys:
+    start: Start position of the chromosome (bin)
+    length: Length of the chromosome (bin)
+    starts: Positions of the track elements, in sorted order
+    vals: Values of the track elements, or None for tracks without values
+    snps: Rsids of the track elements (snps column), or None for tracks without rsids
+
+    See also quick/webtools/clustering/TrackSnapshot.py, which stores these arrays on disk between runs.
+    """
+    pass
+
+
+class TrackArraysStatSplittable(StatisticSplittable):
+
+    def _combineResults(self):
+        arrays = {}
+        for child in self._childResults:
+            arrays[child['chr']] = child
+
+        return arrays
+
+
+class TrackArraysStatUnsplittable(Statistic):
+
+    def _compute(self):
+        rawData = self._children[0].getResult()
+
+        return {
+            'chr': self._region.chr,
+            'start': self._region.start,
+            'length': self._region.getTotalBpSpan(),
+            'starts': rawData.startsAsNumpyArray(),
+            'vals': rawData.valsAsNumpyArray(),
+            'snps': rawData.extrasAsNumpyArray('snps') if rawData.hasExtra('snps') else None
+        }
+
+    def _createChildren(self):
+        self._addChild(RawDataStat(self._region, self._track, TrackFormatReq(allowOverlaps=True)))
@@ -1,9 +1,11 @@
-from numpy import nonzero
+from numpy import concatenate, vstack
 from quick.multitrack.MultiTrackCommon import getGSuiteFromGalaxyTN
 from gold.application.HBAPI import Track, doAnalysis, AnalysisSpec, GlobalBinSource
-from quick.statistic.DistanceMetricsFoundationStat import DistanceMetricsFoundationStat
+from quick.statistic.DistanceMetricsMultiTrackStat import DistanceMetricsMultiTrackStat
 from quick.statistic.PointCountPerMicroBinV2Stat import PointCountPerMicroBinV2Stat
 from quick.webtools.clustering.CommonClusteringFunctions import CommonClusteringFunctions
+from quick.webtools.clustering.PairResultStore import PairResultStore
+from quick.webtools.clustering.TrackSnapshot import TrackSnapshot
 from quick.webtools.mixin.DebugMixin import DebugMixin
 
 
@@ -11,6 +13,11 @@ class BinaryClusteringTool(DebugMixin, CommonClusteringFunctions):
     # Type of comparison
     COMP_DIRECT = 'Direct base pair occurrences'
     COMP_BINS = 'Occurrences within user defined bins'
+    COMP_BIN_SWEEP = 'Occurrences within several bin sizes'
+
+    # Storage of bins
+    BINS_DENSE = 'Boolean vector for each track'
+    BINS_PACKED = 'Compact bit-packed vector for each track'
 
     @staticmethod
     def isPublic():
@@ -29,7 +36,9 @@ class BinaryClusteringTool(DebugMixin, CommonClusteringFunctions):
         return \
             CommonClusteringFunctions.getCommonClusteringInputBoxNames() + [
                 ('Select vector representation', 'vectorDef'),
-                ('Select microbin size', 'microBin')
+                ('Select microbin size', 'microBin'),
+                ('Select storage of microbins', 'binStorage'),
+                ('Select microbin sizes (comma separated)', 'microBins')
             ]
 
     @staticmethod
@@ -38,6 +47,8 @@ class BinaryClusteringTool(DebugMixin, CommonClusteringFunctions):
             'gSuite',
             'vectorDef',
             'microBin',
+            'binStorage',
+            'microBins',
             'distanceCorrMeasure',
             'linkageCriterion',
             'debugMode'
@@ -48,7 +59,8 @@ class BinaryClusteringTool(DebugMixin, CommonClusteringFunctions):
         return [
             CommonClusteringFunctions.DEFAULT_SELECT,
             BinaryClusteringTool.COMP_DIRECT,
-            BinaryClusteringTool.COMP_BINS
+            BinaryClusteringTool.COMP_BINS,
+            BinaryClusteringTool.COMP_BIN_SWEEP
         ]
 
     @staticmethod
@@ -58,6 +70,30 @@ class BinaryClusteringTool(DebugMixin, CommonClusteringFunctions):
         else:
             return None
 
+    @staticmethod
+    def getOptionsBoxBinStorage(choices):
+        if choices.vectorDef == BinaryClusteringTool.COMP_BINS:
+            return [
+                BinaryClusteringTool.BINS_DENSE,
+                BinaryClusteringTool.BINS_PACKED
+            ]
+
+    @staticmethod
+    def getInfoForOptionsBoxBinStorage(choices):
+        return 'With small microbins, the compact representation stores each track as a bitset with one bit per bin, ' \
+               'which use 64 times less memory than a vector of counts.'
+
+    @staticmethod
+    def getOptionsBoxMicroBins(choices):
+        if choices.vectorDef == BinaryClusteringTool.COMP_BIN_SWEEP:
+            return '10000, 50000, 100000, 500000, 1000000'
+        else:
+            return None
+
+    @staticmethod
+    def getInfoForOptionsBoxMicroBins(choices):
+        return 'The positions of each track are read once, and the distances are computed for each of the bin sizes.'
+
     @classmethod
     def execute(cls, choices, galaxyFn=None, username=''):
         import time
@@ -82,10 +118,18 @@ class BinaryClusteringTool(DebugMixin, CommonClusteringFunctions):
         cls.htmlClusterSubtext(choices.distanceCorrMeasure, cls.CORR_DISTLIST, choices.linkageCriterion, htmlCore)
 
         # Get distance / correlation matrixes
+        measures = cls.getSelectedMeasures(choices.distanceCorrMeasure, cls.CORR_DISTLIST)
         if choices.vectorDef == BinaryClusteringTool.COMP_DIRECT:
-            distDict, labels = cls.directVectorDistance(gSuite, analysisBins)
+            distDict, labels = cls.directVectorDistance(gSuite, analysisBins, measures)
         elif choices.vectorDef == BinaryClusteringTool.COMP_BINS:
-            distDict, labels = cls.microBinDistance(gSuite, analysisBins, choices)
+            distDict, labels = cls.microBinDistance(gSuite, analysisBins, choices, measures)
+        elif choices.vectorDef == BinaryClusteringTool.COMP_BIN_SWEEP:
+            distDicts, labels = cls.microBinSweepDistance(gSuite, analysisBins, choices, measures)
+            for binSize, sweepDistDict in distDicts:
+                htmlCore.divider(True)
+                htmlCore.header('Microbin size: ' + str(binSize))
+                cls.printDistPlots(sweepDistDict, labels, choices.distanceCorrMeasure, choices.linkageCriterion,
+                                   galaxyFn, htmlCore, resultName=str(binSize))
 
         # Print plots
         if distDict and labels:
@@ -101,71 +145,115 @@ class BinaryClusteringTool(DebugMixin, CommonClusteringFunctions):
         return 'html'
 
     @classmethod
-    def directVectorDistance(cls, gSuite, analysisBins):
+    def directVectorDistance(cls, gSuite, analysisBins, measures):
         """
         Each base pair represents its own feature.
+        All pairs are counted in one traversal of the genome, where each track is read once per chromosome.
+        The traversal is skipped if all pairs are stored in the PairResultStore from an earlier run.
         """
-        analysisSpec = AnalysisSpec(DistanceMetricsFoundationStat)
+        analysisSpec = AnalysisSpec(DistanceMetricsMultiTrackStat)
         labels = []
-        size = gSuite.numTracks()
-        distDict = cls.createDistDict(cls.CORR_DISTLIST)
+        tracks = []
+        distDict = cls.createDistDict(measures)
 
-        for i in range(0, size):
-            gSuiteTrack1 = gSuite.getTrackFromIndex(i)
-            labels.append(gSuiteTrack1.title)
+        for gSuiteTrack in gSuite.allTracks():
+            labels.append(gSuiteTrack.title)
+            tracks.append(Track(gSuiteTrack.trackName))
 
-            for j in range(i + 1, size):
-                gSuiteTrack2 = gSuite.getTrackFromIndex(j)
-                track1 = Track(gSuiteTrack1.trackName)
-                track2 = Track(gSuiteTrack2.trackName)
+        def computeCounts(indexPairs):
+            count = doAnalysis(analysisSpec, analysisBins, tracks).getGlobalResult()
+            return cls.selectPairCounts(count['a'], count['b'], count['c'], count['d'], indexPairs, len(tracks))
 
-                count = doAnalysis(analysisSpec, analysisBins, [track1, track2]).getGlobalResult()
-                cls.updateDistDict(distDict, count)
+        statKey = PairResultStore.getStatKey('DistanceMetricsMultiTrackStat')
+        counts = cls.getPairCounts(cls.getTrackHashes(tracks, analysisBins), statKey, computeCounts)
+        cls.setDistDictFromCounts(distDict, counts)
 
         return distDict, labels
 
     @classmethod
-    def microBinDistance(cls, gSuite, analysisBins, choices):
+    def microBinDistance(cls, gSuite, analysisBins, choices, measures):
         """
         Each bin represents a feature.
+        The bins of all tracks are stacked into a boolean occupancy matrix, so that matches for all pairs are found
+        with one matrix product.
+        The bins are only computed if some pairs are not stored in the PairResultStore from an earlier run.
         """
-        bins = []
         labels = []
-        size = gSuite.numTracks()
-        distDict = cls.createDistDict(cls.CORR_DISTLIST)
+        tracks = []
+        distDict = cls.createDistDict(measures)
 
         analysisSpec = AnalysisSpec(PointCountPerMicroBinV2Stat)
         analysisSpec.addParameter('microBin', int(choices.microBin))
 
-        # Get bins:
         for gSuiteTrack in gSuite.allTracks():
             labels.append(gSuiteTrack.title)
-            track = [Track(gSuiteTrack.trackName)]
-            res = doAnalysis(analysisSpec, analysisBins, track).getGlobalResult()
-            if 'Result' in res:
-                result = res['Result']
-                bins.append(result)
-
-        for i in range(0, size):
-            for j in range(i + 1, size):
-                bin1 = bins[i]
-                bin2 = bins[j]
-                count = {'a': 0, 'b': 0, 'c': 0, 'd': 0}
-
-                # Create numpy masks
-                nonzero_intersect = nonzero((bin1 != 0) & (bin2 != 0))
-                nonzero_snps1 = nonzero(bin1)
-                nonzero_snps2 = nonzero(bin2)
-
-                # Use masks to find a, b, c, d
-                count['a'] = len(bin1[nonzero_intersect])
-                count['b'] = len(bin1[nonzero_snps1]) - count['a']
-                count['c'] = len(bin2[nonzero_snps2]) - count['a']
-                count['d'] = len(bin1) - count['a'] - count['b'] - count['c']
-                cls.updateDistDict(distDict, count)
+            tracks.append(Track(gSuiteTrack.trackName))
+
+        def computeCounts(indexPairs):
+            # Get bins:
+            bins = []
+            isPacked = choices.binStorage == BinaryClusteringTool.BINS_PACKED
+            binCount = 0
+            for track in tracks:
+                res = doAnalysis(analysisSpec, analysisBins, [track]).getGlobalResult()
+                if 'Result' in res:
+                    result = res['Result']
+                    binCount = len(result)
+                    bins.append(cls.packOccupancy(result != 0) if isPacked else result != 0)
+
+            if isPacked:
+                a, b, c, d = cls.getPackedMatchCounts(bins, binCount)
+            else:
+                a, b, c, d = cls.getOccupancyMatchCounts(vstack(bins))
+            return cls.selectPairCounts(a, b, c, d, indexPairs, len(bins))
+
+        statKey = PairResultStore.getStatKey('PointCountPerMicroBinV2Stat', microBin=int(choices.microBin))
+        counts = cls.getPairCounts(cls.getTrackHashes(tracks, analysisBins), statKey, computeCounts)
+        cls.setDistDictFromCounts(distDict, counts)
 
         return distDict, labels
 
+    @classmethod
+    def microBinSweepDistance(cls, gSuite, analysisBins, choices, measures):
+        """
+        Each bin represents a feature, for several sizes of bins.
+        The positions of each track are read from its TrackSnapshot. For each bin size, the bin of a position is
+        found by integer division with the bin size, where bins are numbered consecutively over all chromosomes.
+        Returns a list of (bin size, distance dictionary) pairs, along with the labels.
+        """
+        labels = []
+        tracks = []
+
+        for gSuiteTrack in gSuite.allTracks():
+            labels.append(gSuiteTrack.title)
+            tracks.append(Track(gSuiteTrack.trackName))
+
+        trackArrays = TrackSnapshot.getTrackArrays(tracks, analysisBins)
+
+        chromosomes = sorted(trackArrays[0].keys())
+
+        distDicts = []
+        for binSize in cls.getMicroBinSizes(choices.microBins):
+            binIndexes = [[] for _ in trackArrays]
+            binCount = 0
+            for chromosome in chromosomes:
+                for trackIndex, arrays in enumerate(trackArrays):
+                    chrArrays = arrays[chromosome]
+                    binIndexes[trackIndex].append(binCount + (chrArrays['starts'] - chrArrays['start']) // binSize)
+                chrLength = trackArrays[0][chromosome]['length']
+                binCount += (chrLength + binSize - 1) // binSize
+
+            distDict = cls.createDistDict(measures)
+            a, b, c, d = cls.getIndexMatchCounts([concatenate(indexes) for indexes in binIndexes], binCount)
+            cls.setDistDict(distDict, a, b, c, d)
+            distDicts.append((binSize, distDict))
+
+        return distDicts, labels
+
+    @classmethod
+    def getMicroBinSizes(cls, microBins):
+        return [int(binSize) for binSize in microBins.split(',')]
+
     @staticmethod
     def validateAndReturnErrors(choices):
         """
@@ -191,6 +279,14 @@ class BinaryClusteringTool(DebugMixin, CommonClusteringFunctions):
             except:
                 return 'Please define bins size as a positive integer'
 
+        if choices.vectorDef == BinaryClusteringTool.COMP_BIN_SWEEP:
+            try:
+                binSizes = BinaryClusteringTool.getMicroBinSizes(choices.microBins)
+                if any(binSize <= 0 for binSize in binSizes):
+                    return 'Please define bin sizes as positive integers, separated by commas'
+            except:
+                return 'Please define bin sizes as positive integers, separated by commas'
+
         errorString = CommonClusteringFunctions.checkClusterOptions(
             choices.distanceCorrMeasure,
             choices.linkageCriterion
@@ -212,6 +308,8 @@ class BinaryClusteringTool(DebugMixin, CommonClusteringFunctions):
                        'Each feature is a 0 or 1, denoting absence or presence of a track element at that feature. '
                        'For each pair of tracks, a binary matching representation is computed, as defined below. '
                        )
+        core.paragraph('To compare different sizes of bins, several bin sizes can be given at once. The tracks are '
+                       'then read once, and clustering results are reported for each bin size.')
         core.divider()
         core.smallHeader('Matching definitions')
         core.paragraph('We compute the following matching values for each pair of tracks. Each pair of features '
@@ -1,15 +1,22 @@
-from gold.application.HBAPI import doAnalysis
-from gold.description.AnalysisDefHandler import AnalysisSpec
 from gold.track.Track import Track
 from quick.application.UserBinSource import GlobalBinSource
 from quick.multitrack.MultiTrackCommon import getGSuiteFromGalaxyTN
-from quick.statistic.OverlappingValsListStat import OverlappingValsListStat
+from quick.statistic.OverlappingValsListStat import OverlappingValsListStatUnsplittable
 from quick.webtools.clustering.CommonCorrelationFunctions import CommonCorrelationFunctions
+from quick.webtools.clustering.PairExecutor import PairExecutor
+from quick.webtools.clustering.PairResultStore import PairResultStore
+from quick.webtools.clustering.TrackSnapshot import TrackSnapshot
 from quick.webtools.mixin.DebugMixin import DebugMixin
 
 
 class CorrelationCoefficientClusteringTool(DebugMixin, CommonCorrelationFunctions):
 
+    # Computation of the vectors
+    VECTORS_PAIRWISE = 'Read both tracks for each pair of tracks'
+    VECTORS_MATRIX = 'Read each track once, into a genome-wide value matrix'
+
+    VALUE_MATRIX_VERSION = '1'
+
     @staticmethod
     def getToolName():
         return "Find correlation between vectors of values from pairs of tracks"
@@ -20,16 +27,34 @@ class CorrelationCoefficientClusteringTool(DebugMixin, CommonCorrelationFunction
 
     @classmethod
     def getInputBoxNames(cls):
-        return cls.getCommonCorrelationInputBoxes() + cls.getInputBoxNamesForDebug()
+        return cls.getCommonCorrelationInputBoxes() + [
+            ('Select computation of vectors', 'vectorComputation'),
+            ('Number of parallel workers', 'workerCount')
+        ] + cls.getInputBoxNamesForDebug()
 
     @staticmethod
     def getInputBoxOrder():
         return [
             'gSuite',
+            'vectorComputation',
             'corrStat',
-            'linkageCriterion'
+            'linkageCriterion',
+            'workerCount'
+        ]
+
+    @staticmethod
+    def getOptionsBoxVectorComputation(choices):
+        return [
+            CorrelationCoefficientClusteringTool.VECTORS_PAIRWISE,
+            CorrelationCoefficientClusteringTool.VECTORS_MATRIX
         ]
 
+    @staticmethod
+    def getInfoForOptionsBoxVectorComputation(choices):
+        return 'With many tracks, the value matrix is much faster, as each track is read once rather than once for ' \
+               'every pair. The matrix is stored, and reused by later runs on the same tracks. Unlike the pairwise ' \
+               'computation, the matrix leaves out infinite values and NaN, as missing values.'
+
     @classmethod
     def execute(cls, choices, galaxyFn=None, username=''):
         import time
@@ -53,7 +78,10 @@ class CorrelationCoefficientClusteringTool(DebugMixin, CommonCorrelationFunction
                                choices.linkageCriterion, htmlCore)
         cls.htmlVectorExplanation(htmlCore)
 
-        corrDict, labels = cls.trackOverlapValuesCorrelation(analysisBins, gSuite)
+        if choices.vectorComputation == cls.VECTORS_MATRIX:
+            corrDict, labels = cls.valueMatrixCorrelation(analysisBins, gSuite, galaxyFn, htmlCore)
+        else:
+            corrDict, labels = cls.trackOverlapValuesCorrelation(analysisBins, gSuite, int(choices.workerCount))
         if corrDict and labels:
             cls.printCorrPlots(corrDict, labels, choices.corrStat, choices.linkageCriterion, galaxyFn, htmlCore)
 
@@ -62,39 +90,150 @@ class CorrelationCoefficientClusteringTool(DebugMixin, CommonCorrelationFunction
         print htmlCore
 
     @classmethod
-    def trackOverlapValuesCorrelation(cls, analysisBins, gSuite):
+    def trackOverlapValuesCorrelation(cls, analysisBins, gSuite, workerCount=PairExecutor.DEFAULT_WORKER_COUNT):
         """
-        Represent each track as a vector with values at positions that are present in both tracks
+        Represent each track as a vector with values at positions that are present in both tracks.
+        The pairs of tracks are computed in parallel, on workerCount processes, where each worker correlates the
+        vectors of a pair and only returns the coefficients, so that only the vectors of the pairs being computed are
+        kept in memory. The tracks are read from their TrackSnapshot, which the worker processes share.
         """
+        import numpy as np
+
         corrDict = cls.createDistDict([cls.CORR_PEARSON, cls.CORR_SPEARMAN])
-        analysisSpec = AnalysisSpec(OverlappingValsListStat)
-        gSuiteSize = gSuite.numTracks()
+        corrStats = cls.getDistDictKeys(corrDict)
         labels = []
+        tracks = []
 
-        for i in range(0, gSuiteSize):
-
-            gSuiteTrack = gSuite.getTrackFromIndex(i)
+        for gSuiteTrack in gSuite.allTracks():
             labels.append(gSuiteTrack.title)
+            tracks.append(Track(gSuiteTrack.trackName))
 
-            for j in range(i + 1, gSuiteSize):
+        trackArrays = TrackSnapshot.getTrackArrays(tracks, analysisBins)
 
-                gSuiteTrack2 = gSuite.getTrackFromIndex(j)
-                track1 = Track(gSuiteTrack.trackName)
-                track2 = Track(gSuiteTrack2.trackName)
+        def computePair(i, j):
+            track1List = [np.zeros(0)]
+            track2List = [np.zeros(0)]
 
-                track1List = []
-                track2List = []
+            for chromosome in sorted(trackArrays[i]):
+                if chromosome in trackArrays[j]:
+                    arrays1 = trackArrays[i][chromosome]
+                    arrays2 = trackArrays[j][chromosome]
+                    pvalsX, pvalsY = OverlappingValsListStatUnsplittable.getOverlappingValues(
+                        arrays1['starts'], arrays1['vals'], arrays2['starts'], arrays2['vals']
+                    )
+                    track1List.append(pvalsX)
+                    track2List.append(pvalsY)
 
-                result = doAnalysis(analysisSpec, analysisBins, [track1, track2]).getGlobalResult()
+            return cls.getVectorCorrelations(np.concatenate(track1List), np.concatenate(track2List), corrStats)
 
-                if 'X' in result and 'Y' in result:
-                    track1List = result['X']
-                    track2List = result['Y']
+        indexPairs = PairExecutor.getIndexPairs(len(tracks))
+        costs = PairExecutor.getPairCosts([TrackSnapshot.getTrackSize(arrays) for arrays in trackArrays], indexPairs)
+        for correlations in PairExecutor.run(computePair, indexPairs, costs, workerCount):
+            for corr in corrStats:
+                corrDict[corr].append(correlations[corr])
 
-                cls.updateCorrDict(corrDict, track1List, track2List)
+        return corrDict, labels
 
+    @classmethod
+    def valueMatrixCorrelation(cls, analysisBins, gSuite, galaxyFn, htmlCore):
+        """
+        Represent each track as a column of a genome-wide position x track value matrix, where each pair of tracks
+        is correlated on the positions present in both tracks, as with trackOverlapValuesCorrelation. Each track is
+        only read once, and the correlations of all pairs are computed from the matrix at once.
+        """
+        corrDict = cls.createDistDict([cls.CORR_PEARSON, cls.CORR_SPEARMAN])
+        labels = []
+        tracks = []
+
+        for gSuiteTrack in gSuite.allTracks():
+            labels.append(gSuiteTrack.title)
+            tracks.append(Track(gSuiteTrack.trackName))
+
+        matrixFile = cls.getValueMatrixFile(tracks, analysisBins)
+        valueMatrix = cls.loadValueMatrix(matrixFile)
+        correlations = cls.getSparseMatrixCorrelations(valueMatrix, cls.getDistDictKeys(corrDict))
+        for corr in cls.getDistDictKeys(corrDict):
+            corrDict[corr] = correlations[corr]
+
+        cls.htmlValueMatrixLink(matrixFile, valueMatrix, galaxyFn, htmlCore)
         return corrDict, labels
 
+    @classmethod
+    def getValueMatrixFile(cls, tracks, analysisBins):
+        """
+        Returns the file of the value matrix of the tracks, stored in the static files of the HyperBrowser. The file
+        is identified by the content of the tracks, so the matrix is only computed the first time a set of tracks is
+        used. The matrix is computed by getValueCells, from the TrackSnapshot of each track.
+        """
+        import os
+        from quick.util.StaticFile import StaticFile
+
+        trackArrays = TrackSnapshot.getTrackArrays(tracks, analysisBins)
+        trackHashes = [TrackSnapshot.getTrackHash(arrays) for arrays in trackArrays]
+        matrixKey = PairResultStore.getHash([cls.VALUE_MATRIX_VERSION] + trackHashes)
+        matrixFile = StaticFile(['files', 'clustering_cache', 'value_matrix_' + matrixKey + '.npz']).getDiskPath(True)
+        if not os.path.exists(matrixFile):
+            matrices = {}
+            for chromosome in sorted(trackArrays[0]):
+                chrArrays = [arrays[chromosome] for arrays in trackArrays]
+                positions, rows, cols, values = cls.getValueCells(
+                    [arrays['starts'] for arrays in chrArrays], [arrays['vals'] for arrays in chrArrays]
+                )
+                matrices[chromosome] = {'positions': positions, 'rows': rows, 'cols': cols, 'values': values}
+            cls.saveValueMatrix(matrixFile, matrices, len(tracks))
+
+        return matrixFile
+
+    @classmethod
+    def saveValueMatrix(cls, fileName, matrices, trackCount):
+        """
+        Saves the value matrices of all chromosomes, as computed by getValueCells, as one genome-wide matrix in a
+        .npz file, where the rows of each chromosome follow those of the previous one.
+        """
+        import os
+        import tempfile
+        import numpy as np
+
+        chromosomes = sorted(matrices)
+        rowCounts = [len(matrices[chromosome]['positions']) for chromosome in chromosomes]
+        rowOffsets = np.cumsum([0] + rowCounts)
+
+        # Written to a temporary file of its own first, so that other runs never read a partly written matrix
+        fileDescriptor, tempFileName = tempfile.mkstemp(dir=os.path.dirname(fileName), suffix='.npz')
+        try:
+            with os.fdopen(fileDescriptor, 'wb') as tempFile:
+                np.savez(
+                    tempFile,
+                    chromosomes=np.array(chromosomes),
+                    chromosomeOffsets=rowOffsets,
+                    positions=np.concatenate([matrices[chromosome]['positions'] for chromosome in chromosomes] +
+                                             [np.zeros(0, dtype=np.int64)]),
+                    rows=np.concatenate([matrices[chromosome]['rows'] + offset
+                                         for chromosome, offset in zip(chromosomes, rowOffsets)] +
+                                        [np.zeros(0, dtype=np.int64)]),
+                    cols=np.concatenate([matrices[chromosome]['cols'] for chromosome in chromosomes] +
+                                        [np.zeros(0, dtype=np.int64)]),
+                    values=np.concatenate([matrices[chromosome]['values'] for chromosome in chromosomes] +
+                                          [np.zeros(0)]),
+                    trackCount=trackCount
+                )
+            os.rename(tempFileName, fileName)
+        finally:
+            if os.path.exists(tempFileName):
+                os.remove(tempFileName)
+
+    @classmethod
+    def loadValueMatrix(cls, fileName):
+        """Loads the genome-wide value matrix saved by saveValueMatrix, as a sparse position x track matrix."""
+        import numpy as np
+        from scipy.sparse import csr_matrix
+
+        matrixData = np.load(fileName)
+        return csr_matrix(
+            (matrixData['values'], (matrixData['rows'], matrixData['cols'])),
+            shape=(len(matrixData['positions']), int(matrixData['trackCount']))
+        )
+
     @staticmethod
     def validateAndReturnErrors(choices):
         """
@@ -114,6 +253,10 @@ class CorrelationCoefficientClusteringTool(DebugMixin, CommonCorrelationFunction
         if choices.linkageCriterion == CommonCorrelationFunctions.DEFAULT_SELECT:
             return 'Please select a linkage criterion'
 
+        errorString = CommonCorrelationFunctions.checkWorkerCount(choices.workerCount)
+        if errorString:
+            return errorString
+
     @staticmethod
     def getToolDescription():
         from gold.result.HtmlCore import HtmlCore
@@ -132,6 +275,20 @@ class CorrelationCoefficientClusteringTool(DebugMixin, CommonCorrelationFunction
                        "A vector size of at least 100, i.e. at least 100 overlapping SNPs between two tracks to be "
                        "compared, is recommended.")
         core.divider()
+        core.smallHeader("Computation of vectors")
+        core.paragraph("The vectors can be found by reading both tracks for each pair of tracks, or by reading each "
+                       "track once, into a genome-wide matrix holding the value of each track at every SNP position. "
+                       "In the matrix, the most significant value is kept for positions with several SNPs, and "
+                       "infinite values and NaN are left out, as missing values. Each pair of tracks is then "
+                       "correlated on the positions where both tracks have a value. The matrix is stored, so later "
+                       "runs on the same tracks do not have to read the tracks again, and can be downloaded as a "
+                       "NumPy .npz file.")
+        core.paragraph("Note that the two computations treat infinite values and NaN differently. When both tracks "
+                       "are read for each pair, these values are kept in the vectors, so a pair with such a value at "
+                       "an overlapping SNP gets a Pearson coefficient of NaN, and a Spearman coefficient of NaN if "
+                       "the value is NaN, while infinite values are ranked as the highest values. In the value "
+                       "matrix, the pair is correlated on its other overlapping positions.")
+        core.divider()
         core.smallHeader("Conversion to distance")
         core.paragraph('To cluster the tracks, the correlation coefficients must be converted into standardized '
                        'distance measures. <br>'
@@ -149,6 +306,17 @@ class CorrelationCoefficientClusteringTool(DebugMixin, CommonCorrelationFunction
     def isDebugMode():
         return False
 
+    @classmethod
+    def htmlValueMatrixLink(cls, matrixFile, valueMatrix, galaxyFn, htmlCore):
+        import shutil
+        from quick.util.StaticFile import GalaxyRunSpecificFile
+
+        runMatrixFile = GalaxyRunSpecificFile(['value_matrix.npz'], galaxyFn)
+        shutil.copyfile(matrixFile, runMatrixFile.getDiskPath(True))
+        htmlCore.line('The value matrix holds ' + str(valueMatrix.nnz) + ' values at ' +
+                      str(valueMatrix.shape[0]) + ' unique positions. ' +
+                      runMatrixFile.getLink('Download the value matrix (NumPy .npz file)'))
+
     @classmethod
     def htmlVectorExplanation(cls, htmlCore):
         htmlCore.line("The vectors of this computation contains the point values of the different tracks. ")
@@ -97,9 +97,8 @@ class EmpiricLDDataTool(GeneralGuiTool, DebugMixin):
     @classmethod
     def getLDDistances(cls, ldGraphTrack, rSquare, galaxyFn, htmlCore):
         graph = LDExpansions.createRSquareGraph(ldGraphTrack, rSquare)
-        positions = LDExpansions.createPositionDict(ldGraphTrack)
 
-        distances = cls.findAllDistancesInLD(graph, positions, rSquare, htmlCore)
+        distances = cls.findAllDistancesInLD(graph, rSquare, htmlCore)
         bins = range(0, 525000, 25000)
         cls.plotDistances(distances, galaxyFn, bins, rSquare, htmlCore)
 
@@ -124,26 +123,23 @@ class EmpiricLDDataTool(GeneralGuiTool, DebugMixin):
         htmlCore.divEnd()
 
     @classmethod
-    def findAllDistancesInLD(cls, graph, positionDict, r2Filter, htmlCore):
-        distances = []
-        for rsidPair, r2 in graph.items():
-            if r2 < r2Filter:
-                continue
-
-            rsid1 = rsidPair[0]
-            rsid2 = rsidPair[1]
-
-            if rsid1 == rsid2:
-                continue
-
-            pos1 = LDExpansions.getPosition(positionDict, rsid1)
-            pos2 = LDExpansions.getPosition(positionDict, rsid2)
+    def findAllDistancesInLD(cls, graph, r2Filter, htmlCore):
+        """
+        Physical distances between all pairs of SNPs in LD with rsquare >= r2Filter, where both SNPs are elements of
+        the linked point track, found from the edge arrays and positions of the LD graph.
+        """
+        import numpy as np
+        from quick.webtools.clustering.LDGraph import LDGraph
 
-            if pos1 == -1 or pos2 == -1:
-                continue
+        ids1, ids2, weights = graph.getEdgeArrays()
+        positions = graph.getPositions()
+        positions1 = positions[ids1]
+        positions2 = positions[ids2]
 
-            distance = abs(pos1 - pos2)
-            distances.append(distance)
+        # Rsquare values are compared at the resolution of the quantized weights of the graph
+        isIncluded = (LDGraph.quantizeWeights(weights) >= LDGraph.quantizeWeights([r2Filter])[0]) & \
+            (positions1 != -1) & (positions2 != -1)
+        distances = np.abs(positions1[isIncluded] - positions2[isIncluded]).tolist()
 
         cls.printSummary(distances, htmlCore, r2Filter)
         return distances
@@ -183,7 +179,6 @@ class EmpiricLDDataTool(GeneralGuiTool, DebugMixin):
     def getLDDistancesOfMultipleRsquares(cls, ldGraphTrack, rSquareThresholds, galaxyFn, htmlCore):
 
         graph = LDExpansions.createRSquareGraph(ldGraphTrack, 0)
-        positions = LDExpansions.createPositionDict(ldGraphTrack)
         ldDistances = []
         rSquareLabels = []
         bins = []
@@ -194,7 +189,7 @@ class EmpiricLDDataTool(GeneralGuiTool, DebugMixin):
 
             rSquareLabels.append(rSquare)
             rSquare = float(rSquare)
-            distances = cls.findAllDistancesInLD(graph, positions, rSquare, htmlCore)
+            distances = cls.findAllDistancesInLD(graph, rSquare, htmlCore)
             bins, ldPairCount = cls.standardizeLineGraph(distances)
             ldDistances.append(ldPairCount)
 
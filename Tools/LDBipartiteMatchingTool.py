@@ -4,6 +4,8 @@ from gold.application.HBAPI import GlobalBinSource, doAnalysis
 from quick.webtools.clustering.BipartiteMatching import BipartiteMatching
 from quick.webtools.clustering.CommonClusteringFunctions import CommonClusteringFunctions
 from quick.webtools.clustering.LDExpansions import LDExpansions
+from quick.webtools.clustering.PairExecutor import PairExecutor
+from quick.webtools.clustering.PairResultStore import PairResultStore
 from quick.webtools.mixin.DebugMixin import DebugMixin
 
 
@@ -41,6 +43,7 @@ class LDBipartiteMatchingTool(DebugMixin, CommonClusteringFunctions):
             'ldGraphMatching',
             'distanceMeasure',
             'linkageCriterion',
+            'workerCount',
             'debugMode'
         ]
 
@@ -95,23 +98,34 @@ class LDBipartiteMatchingTool(DebugMixin, CommonClusteringFunctions):
         graph = LDExpansions.createRSquareGraph(choices.ldGraphTrack, float(choices.rSquare))
         tracks, labels = LDExpansions.generateTracksAndLabels(gSuite, analysisBins)
 
-        # Find distance/correlation matrices
-        size = gSuite.numTracks()
-        distDict = cls.createDistDict(cls.CLUSTER_LIST)
-        for i in range(0, size):
-            for j in range(i + 1, size):
+        # Find distance/correlation matrices, computing pairs not stored from an earlier run in parallel
+        distDict = cls.createDistDict(cls.getSelectedMeasures(choices.distanceMeasure, cls.CLUSTER_LIST))
 
-                track1 = tracks[i]
-                track2 = tracks[j]
+        def computePair(i, j):
+            track1 = tracks[i]
+            track2 = tracks[j]
 
-                cost_matrix = BipartiteMatching.generateCostMatrix(track1, track2, graph)
+            cost_matrix = BipartiteMatching.generateSparseCostMatrix(track1, track2, graph)
 
-                if choices.ldGraphMatching == LDBipartiteMatchingTool.LD_GREEDY:
-                    count = BipartiteMatching.greedyBipartite(cost_matrix)
-                else:
-                    count = BipartiteMatching.lapjvBipartite(cost_matrix)
+            if choices.ldGraphMatching == LDBipartiteMatchingTool.LD_GREEDY:
+                return BipartiteMatching.greedyBipartite(cost_matrix)
+            else:
+                return BipartiteMatching.lapjvBipartite(cost_matrix)
 
-                cls.updateDistDict(distDict, count)
+        def computeCounts(indexPairs):
+            costs = PairExecutor.getPairCosts([len(track) for track in tracks], indexPairs)
+            return PairExecutor.run(computePair, indexPairs, costs, int(choices.workerCount))
+
+        statKey = PairResultStore.getStatKey(
+            choices.ldGraphMatching,
+            rSquare=float(choices.rSquare),
+            ldGraph=LDExpansions.getLDGraphKey(choices.ldGraphTrack),
+            matchingVersion=BipartiteMatching.MATCHING_VERSION
+        )
+        hashes = [PairResultStore.getHash(track) for track in tracks]
+        counts = cls.getPairCounts(hashes, statKey, computeCounts)
+
+        cls.setDistDictFromCounts(distDict, counts)
 
         # Cluster and print plots
         cls.printDistPlots(distDict, labels, choices.distanceMeasure, choices.linkageCriterion, galaxyFn, htmlCore)
@@ -160,6 +174,10 @@ class LDBipartiteMatchingTool(DebugMixin, CommonClusteringFunctions):
         if errorString:
             return errorString
 
+        errorString = CommonClusteringFunctions.checkWorkerCount(choices.workerCount)
+        if errorString:
+            return errorString
+
         return None
 
     @staticmethod
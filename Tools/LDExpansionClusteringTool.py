@@ -7,6 +7,9 @@ from quick.multitrack.MultiTrackCommon import getGSuiteFromGalaxyTN
 from quick.statistic.ExpandTrackAndMatchStat import ExpandTrackAndMatchStat
 from quick.webtools.GeneralGuiTool import GeneralGuiTool
 from quick.webtools.clustering.CommonClusteringFunctions import CommonClusteringFunctions
+from quick.webtools.clustering.LDExpansions import LDExpansions
+from quick.webtools.clustering.PairExecutor import PairExecutor
+from quick.webtools.clustering.PairResultStore import PairResultStore
 from quick.webtools.mixin.DebugMixin import DebugMixin
 
 
@@ -38,6 +41,7 @@ class LDExpansionClusteringTool(CommonClusteringFunctions, DebugMixin):
             'rSquare',
             'distanceMeasure',
             'linkageCriterion',
+            'workerCount',
             'debugMode'
         ]
 
@@ -86,19 +90,29 @@ class LDExpansionClusteringTool(CommonClusteringFunctions, DebugMixin):
         trackName = ExternalTrackManager.getPreProcessedTrackFromGalaxyTN(gSuite.genome, splitName)
         linkedPointTrack = Track(trackName)
 
-        # Find distance/correlation matrix
+        # Find distance/correlation matrix, computing pairs not stored from an earlier run in parallel
         labels = []
-        distDict = cls.createDistDict(cls.CLUSTER_LIST)
-        size = gSuite.numTracks()
-        for i in range(0, size):
-            gSuiteTrack1 = gSuite.getTrackFromIndex(i)
-            labels.append(gSuiteTrack1.title)
-            for j in range(i + 1, size):
-                gSuiteTrack2 = gSuite.getTrackFromIndex(j)
-                track1 = Track(gSuiteTrack1.trackName)
-                track2 = Track(gSuiteTrack2.trackName)
-                count = doAnalysis(analysisSpec, analysisBins, [track1, track2, linkedPointTrack]).getGlobalResult()
-                cls.updateDistDict(distDict, count)
+        tracks = []
+        distDict = cls.createDistDict(cls.getSelectedMeasures(choices.distanceMeasure, cls.CLUSTER_LIST))
+        for gSuiteTrack in gSuite.allTracks():
+            labels.append(gSuiteTrack.title)
+            tracks.append(Track(gSuiteTrack.trackName))
+
+        def computePair(i, j):
+            return doAnalysis(analysisSpec, analysisBins, [tracks[i], tracks[j], linkedPointTrack]).getGlobalResult()
+
+        def computeCounts(indexPairs):
+            costs = PairExecutor.getPairCosts(cls.getTrackSizes(tracks, analysisBins), indexPairs)
+            return PairExecutor.run(computePair, indexPairs, costs, int(choices.workerCount))
+
+        statKey = PairResultStore.getStatKey(
+            'ExpandTrackAndMatchStat',
+            rSquare=float(choices.rSquare),
+            ldTrack=LDExpansions.getLDGraphKey(choices.ldTrack)
+        )
+        counts = cls.getPairCounts(cls.getTrackHashes(tracks, analysisBins), statKey, computeCounts)
+
+        cls.setDistDictFromCounts(distDict, counts)
 
         # Cluster and print plots
         cls.printDistPlots(distDict, labels, choices.distanceMeasure, choices.linkageCriterion, galaxyFn, htmlCore)
@@ -134,6 +148,10 @@ class LDExpansionClusteringTool(CommonClusteringFunctions, DebugMixin):
         if errorString:
             return errorString
 
+        errorString = CommonClusteringFunctions.checkWorkerCount(choices.workerCount)
+        if errorString:
+            return errorString
+
         return None
 
     @staticmethod
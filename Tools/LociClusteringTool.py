@@ -1,8 +1,14 @@
 from quick.multitrack.MultiTrackCommon import getGSuiteFromGalaxyTN
 from gold.application.HBAPI import Track, doAnalysis, AnalysisSpec, GlobalBinSource
-from quick.statistic.DistanceMetricsBlockFoundationStat import DistanceMetricsBlockFoundationStat
-from quick.statistic.DistanceMetricsFuzzyFoundationStat import DistanceMetricsFuzzyFoundationStat
+from quick.statistic.DistanceMetricsBlockFoundationStat import DistanceMetricsBlockFoundationStat, \
+    DistanceMetricsBlockFoundationStatUnsplittable
+from quick.statistic.DistanceMetricsFuzzyFoundationStat import DistanceMetricsFuzzyFoundationStat, \
+    DistanceMetricsFuzzyFoundationStatUnsplittable
+from quick.statistic.FilterSNPStat import FilterSNPStatUnsplittable
 from quick.webtools.clustering.CommonClusteringFunctions import CommonClusteringFunctions
+from quick.webtools.clustering.PairExecutor import PairExecutor
+from quick.webtools.clustering.PairResultStore import PairResultStore
+from quick.webtools.clustering.TrackSnapshot import TrackSnapshot
 from quick.webtools.mixin.DebugMixin import DebugMixin
 
 
@@ -43,6 +49,7 @@ class LociClusteringTool(DebugMixin, CommonClusteringFunctions):
             'geneticLocus',
             'distanceMeasure',
             'linkageCriterion',
+            'workerCount',
             'debugMode'
         ]
 
@@ -58,6 +65,11 @@ class LociClusteringTool(DebugMixin, CommonClusteringFunctions):
     def getOptionsBoxGeneticLocus(choices):
         return '500000'
 
+    @staticmethod
+    def getInfoForOptionsBoxGeneticLocus(choices):
+        return 'Give several comma separated ranges, for instance "10000, 100000, 500000, 1000000", to compare the ' \
+               'clustering of the tracks for each range in one run.'
+
     @classmethod
     def execute(cls, choices, galaxyFn=None, username=''):
         import time
@@ -70,33 +82,52 @@ class LociClusteringTool(DebugMixin, CommonClusteringFunctions):
 
         # Set debug environment
         cls._setDebugModeIfSelected(choices)
-
-        # Print tool info
-        cls.htmlClusterTitle(choices.similarityCase, htmlCore)
-        cls.htmlClusterSubtext(choices.distanceMeasure, cls.CLUSTER_LIST, choices.linkageCriterion, htmlCore)
-        htmlCore.line('Range of genetic loci: ' + choices.geneticLocus)
-
-        # Analysis environment
-        gSuite = getGSuiteFromGalaxyTN(choices.gSuite)
-        analysisBins = GlobalBinSource(gSuite.genome)
-        distDict = None
-        labels = None
-
-        if choices.similarityCase == LociClusteringTool.COMP_GAUSS:
-            analysisSpec = AnalysisSpec(DistanceMetricsFuzzyFoundationStat)
-            analysisSpec.addParameter('filterThreshold', int(choices.geneticLocus))
-
-            distDict, labels = cls.computeDistance(gSuite, analysisSpec, analysisBins)
-
-        elif choices.similarityCase == LociClusteringTool.COMP_BLOCK:
-            analysisSpec = AnalysisSpec(DistanceMetricsBlockFoundationStat)
-            analysisSpec.addParameter('filterThreshold', int(choices.geneticLocus))
-
-            distDict, labels = cls.computeDistance(gSuite, analysisSpec, analysisBins)
-
-        # Cluster and print plots
-        if distDict and labels:
-            cls.printDistPlots(distDict, labels, choices.distanceMeasure, choices.linkageCriterion, galaxyFn, htmlCore)
+        with FilterSNPStatUnsplittable.cachedFiltering():
+            # Print tool info
+            cls.htmlClusterTitle(choices.similarityCase, htmlCore)
+            cls.htmlClusterSubtext(choices.distanceMeasure, cls.CLUSTER_LIST, choices.linkageCriterion, htmlCore)
+            htmlCore.line('Range of genetic loci: ' + choices.geneticLocus)
+
+            # Analysis environment
+            gSuite = getGSuiteFromGalaxyTN(choices.gSuite)
+            analysisBins = GlobalBinSource(gSuite.genome)
+            distDict = None
+            labels = None
+            measures = cls.getSelectedMeasures(choices.distanceMeasure, cls.CLUSTER_LIST)
+            lociSizes = cls.getGeneticLocusSizes(choices.geneticLocus)
+
+            if len(lociSizes) > 1:
+                distDicts, labels = cls.computeLociSweep(gSuite, analysisBins, choices.similarityCase, lociSizes,
+                                                         measures, int(choices.workerCount))
+                cls.printLociStability(distDicts, htmlCore)
+                for lociSize, sweepDistDict in distDicts:
+                    htmlCore.divider(True)
+                    htmlCore.header('Range of genetic loci: ' + str(lociSize))
+                    cls.printDistPlots(sweepDistDict, labels, choices.distanceMeasure, choices.linkageCriterion,
+                                       galaxyFn, htmlCore, resultName=str(lociSize))
+
+            elif choices.similarityCase == LociClusteringTool.COMP_GAUSS:
+                analysisSpec = AnalysisSpec(DistanceMetricsFuzzyFoundationStat)
+                analysisSpec.addParameter('filterThreshold', int(choices.geneticLocus))
+                statKey = PairResultStore.getStatKey('DistanceMetricsFuzzyFoundationStat',
+                                                     filterThreshold=int(choices.geneticLocus))
+
+                distDict, labels = cls.computeDistance(gSuite, analysisSpec, analysisBins, measures, statKey,
+                                                       int(choices.workerCount))
+
+            elif choices.similarityCase == LociClusteringTool.COMP_BLOCK:
+                analysisSpec = AnalysisSpec(DistanceMetricsBlockFoundationStat)
+                analysisSpec.addParameter('filterThreshold', int(choices.geneticLocus))
+                statKey = PairResultStore.getStatKey('DistanceMetricsBlockFoundationStat',
+                                                     filterThreshold=int(choices.geneticLocus))
+
+                distDict, labels = cls.computeDistance(gSuite, analysisSpec, analysisBins, measures, statKey,
+                                                       int(choices.workerCount))
+
+            # Cluster and print plots
+            if distDict and labels:
+                cls.printDistPlots(distDict, labels, choices.distanceMeasure, choices.linkageCriterion, galaxyFn,
+                                   htmlCore)
 
         cls.htmlClusterTime(str(time.clock() - start), htmlCore)
         htmlCore.divEnd()
@@ -107,26 +138,130 @@ class LociClusteringTool(DebugMixin, CommonClusteringFunctions):
         return 'html'
 
     @classmethod
-    def computeDistance(cls, gSuite, differentTracksAnalysis, analysisBins):
-
-        distDict = cls.createDistDict(cls.DISTLIST)
+    def computeDistance(cls, gSuite, differentTracksAnalysis, analysisBins, measures, statKey,
+                        workerCount=PairExecutor.DEFAULT_WORKER_COUNT):
+        """
+        Only pairs of tracks that are not in the PairResultStore from an earlier run with the same statistic and
+        genetic loci, are computed. These pairs are computed in parallel, on workerCount processes.
+        """
+        distDict = cls.createDistDict(measures)
         labels = []
+        tracks = []
 
-        trackCount = gSuite.numTracks()
-        for i in range(0, trackCount):
-            gSuiteTrack = gSuite.getTrackFromIndex(i)
-            track = Track(gSuiteTrack.trackName)
+        for gSuiteTrack in gSuite.allTracks():
             labels.append(gSuiteTrack.title)
+            tracks.append(Track(gSuiteTrack.trackName))
 
-            for j in range(i + 1, trackCount):
-                track2 = Track(gSuite.getTrackFromIndex(j).trackName)
-                tracks = [track, track2]
-                count = doAnalysis(differentTracksAnalysis, analysisBins, tracks).getGlobalResult()
+        def computePair(i, j):
+            return doAnalysis(differentTracksAnalysis, analysisBins, [tracks[i], tracks[j]]).getGlobalResult()
 
-                cls.updateDistDict(distDict, count)
+        def computeCounts(indexPairs):
+            costs = PairExecutor.getPairCosts(cls.getTrackSizes(tracks, analysisBins), indexPairs)
+            return PairExecutor.run(computePair, indexPairs, costs, workerCount)
 
+        hashes = cls.getTrackHashes(tracks, analysisBins)
+        counts = cls.getPairCounts(hashes, statKey, computeCounts)
+
+        cls.setDistDictFromCounts(distDict, counts)
         return distDict, labels
 
+    @classmethod
+    def getGeneticLocusSizes(cls, geneticLocus):
+        return [int(lociSize) for lociSize in geneticLocus.split(',')]
+
+    @classmethod
+    def computeLociSweep(cls, gSuite, analysisBins, similarityCase, lociSizes, measures,
+                         workerCount=PairExecutor.DEFAULT_WORKER_COUNT):
+        """
+        Computes a distance dictionary for each range of genetic loci, with the same counts as computeDistance.
+        The positions and values of each track are read from its TrackSnapshot, and are filtered and matched for
+        each range.
+        Returns a list of (range of genetic loci, distance dictionary) pairs, along with the labels.
+        """
+        if similarityCase == LociClusteringTool.COMP_GAUSS:
+            statName = 'DistanceMetricsFuzzyFoundationStat'
+            matchStat = DistanceMetricsFuzzyFoundationStatUnsplittable
+        else:
+            statName = 'DistanceMetricsBlockFoundationStat'
+            matchStat = DistanceMetricsBlockFoundationStatUnsplittable
+
+        labels = []
+        tracks = []
+        for gSuiteTrack in gSuite.allTracks():
+            labels.append(gSuiteTrack.title)
+            tracks.append(Track(gSuiteTrack.trackName))
+
+        hashes = cls.getTrackHashes(tracks, analysisBins)
+        trackArrays = TrackSnapshot.getTrackArrays(tracks, analysisBins)
+
+        distDicts = []
+        for lociSize in lociSizes:
+
+            def computeCounts(indexPairs):
+                filteredTracks = [
+                    dict((chromosome, FilterSNPStatUnsplittable.filterTrack(arrays['starts'], arrays['vals'], lociSize))
+                         for chromosome, arrays in chrArrays.items())
+                    for chrArrays in trackArrays
+                ]
+
+                def computePair(i, j):
+                    count = {'a': 0, 'b': 0, 'c': 0, 'd': 0}
+                    for chromosome in filteredTracks[i]:
+                        a, b, c, d = matchStat.countMatches(filteredTracks[i][chromosome],
+                                                            filteredTracks[j][chromosome], lociSize // 2)
+                        count['a'] += a
+                        count['b'] += b
+                        count['c'] += c
+                        count['d'] += d
+                    return count
+
+                trackSizes = [sum([len(snps) for snps in filtered.values()]) for filtered in filteredTracks]
+                costs = PairExecutor.getPairCosts(trackSizes, indexPairs)
+                return PairExecutor.run(computePair, indexPairs, costs, workerCount)
+
+            statKey = PairResultStore.getStatKey(statName, filterThreshold=lociSize)
+            distDict = cls.createDistDict(measures)
+            cls.setDistDictFromCounts(distDict, cls.getPairCounts(hashes, statKey, computeCounts))
+            distDicts.append((lociSize, distDict))
+
+        return distDicts, labels
+
+    @classmethod
+    def printLociStability(cls, distDicts, htmlCore):
+        """
+        Prints how stable the distances are across the ranges of genetic loci, as the Spearman rank correlation
+        between the distances of all pairs of tracks, for each pair of ranges.
+        """
+        from numpy import isfinite
+        from scipy.stats import spearmanr
+
+        htmlCore.divider(True)
+        htmlCore.smallHeader('Stability of distances across ranges of genetic loci')
+        htmlCore.paragraph('Spearman rank correlation between the distances of all pairs of tracks, computed with '
+                           'different ranges of genetic loci. A correlation close to 1 means that the order of the '
+                           'distances, and therefore the clustering, depend little on the range.')
+
+        lociSizes = [str(lociSize) for lociSize, _ in distDicts]
+        for measure in cls.getDistDictKeys(distDicts[0][1]):
+            htmlCore.divEnd()
+            htmlCore.divBegin(style=CommonClusteringFunctions.TABLE_STYLE)
+            htmlCore.tableHeader([measure] + lociSizes)
+
+            for lociSize, distDict in distDicts:
+                htmlCore.tableRowBegin()
+                htmlCore.tableCell(str(lociSize))
+                for _, otherDistDict in distDicts:
+                    distances = distDict[measure]
+                    otherDistances = otherDistDict[measure]
+                    finite = isfinite(distances) & isfinite(otherDistances)
+                    correlation = spearmanr(distances[finite], otherDistances[finite])[0]
+                    htmlCore.tableCell('%.3f' % correlation)
+                htmlCore.tableRowEnd()
+
+            htmlCore.tableFooter()
+            htmlCore.divEnd()
+            htmlCore.divBegin(style=CommonClusteringFunctions.HTML_STYLE)
+
     @staticmethod
     def validateAndReturnErrors(choices):
         """
@@ -144,11 +279,14 @@ class LociClusteringTool(DebugMixin, CommonClusteringFunctions):
             return 'Please select a genetic loci definition'
 
         try:
-            value = float(choices.geneticLocus)
-            if not value.is_integer():
-                return 'Please define size of genetic loci as a positive integer'
+            for lociSize in choices.geneticLocus.split(','):
+                value = float(lociSize)
+                if not value.is_integer() or value <= 0:
+                    return 'Please define size of genetic loci as a positive integer, or several comma separated ' \
+                           'positive integers'
         except:
-            return 'Please define size of genetic loci as a positive integer'
+            return 'Please define size of genetic loci as a positive integer, or several comma separated positive ' \
+                   'integers'
 
         errorString = CommonClusteringFunctions.checkClusterOptions(
             choices.distanceMeasure,
@@ -157,6 +295,10 @@ class LociClusteringTool(DebugMixin, CommonClusteringFunctions):
         if errorString:
             return errorString
 
+        errorString = CommonClusteringFunctions.checkWorkerCount(choices.workerCount)
+        if errorString:
+            return errorString
+
         return None
 
     @staticmethod
@@ -176,6 +318,10 @@ class LociClusteringTool(DebugMixin, CommonClusteringFunctions):
                        'away two SNPs are from each other, the smaller the overlap score is. The gaussian overlap '
                        'definition does not continue indefinitely, but stops counting overlap at the border of the '
                        'genetic loci')
+        core.paragraph('Several comma separated ranges of genetic loci can be given, to compare the clustering for '
+                       'each range in one run. Each track is then only read once. In addition to the results for each '
+                       'range, a table shows the Spearman rank correlation between the distances found with each pair '
+                       'of ranges, as a measure of how stable the clustering is across the ranges.')
         core.divider()
         core.smallHeader('Matching definitions')
         core.paragraph('We compute the following matching values for each pair of tracks:'
@@ -3,7 +3,7 @@ from gold.description.AnalysisDefHandler import AnalysisSpec
 from gold.track.Track import Track
 from quick.application.UserBinSource import GlobalBinSource
 from quick.multitrack.MultiTrackCommon import getGSuiteFromGalaxyTN
-from quick.statistic.GeneticLociOverlapStat import GeneticLociOverlapStat
+from quick.statistic.GeneticLociOverlapMultiTrackStat import GeneticLociOverlapMultiTrackStat
 from quick.webtools.clustering.CommonCorrelationFunctions import CommonCorrelationFunctions
 from quick.webtools.mixin.DebugMixin import DebugMixin
 
@@ -52,7 +52,7 @@ class OverlapCorrelationClusteringTool(DebugMixin, CommonCorrelationFunctions):
         # Analysis environment
         gSuite = getGSuiteFromGalaxyTN(choices.gSuite)
         analysisBins = GlobalBinSource(gSuite.genome)
-        analysisSpec = AnalysisSpec(GeneticLociOverlapStat)
+        analysisSpec = AnalysisSpec(GeneticLociOverlapMultiTrackStat)
         analysisSpec.addParameter('filterThreshold', int(choices.geneticLocus))
 
         # Print tool information:
@@ -72,54 +72,63 @@ class OverlapCorrelationClusteringTool(DebugMixin, CommonCorrelationFunctions):
 
     @classmethod
     def getOverlapMatrix(cls, analysisBins, analysisSpec, gSuite):
-        overlapMatrix = []
+        """
+        Overlap of all pairs of tracks in the GSuite, computed in one analysis. Returns a square numpy array, where the
+        diagonal (overlap of a track with itself) must be removed before correlating the values, along with the labels.
+        """
         labels = []
-
-        i = 0
+        tracks = []
         for gSuiteTrack in gSuite.allTracks():
-
             labels.append(gSuiteTrack.title)
-            overlapMatrix.append([])
-            track = Track(gSuiteTrack.trackName)
-
-            for gSuiteTrack2 in gSuite.allTracks():
+            tracks.append(Track(gSuiteTrack.trackName))
 
-                if gSuiteTrack == gSuiteTrack2:
-                    overlapMatrix[i].append('.')  # This value must be removed before correlating the values.
-                    continue
-
-                track2 = Track(gSuiteTrack2.trackName)
-                result = doAnalysis(analysisSpec, analysisBins, [track, track2]).getGlobalResult()
-                overlapMatrix[i].append(result['Result'])
-
-            i += 1
-
-        return overlapMatrix, labels
+        result = doAnalysis(analysisSpec, analysisBins, tracks).getGlobalResult()
+        return result['Result'], labels
 
     @classmethod
     def getTriangularCorrMatrix(cls, overlapMatrix):
+        """
+        Pearson and Spearman correlation of the rows of the overlap matrix, for each pair of tracks (i, j), i < j.
+        The overlaps of the tracks with themselves and with each other, i.e. columns i and j, are left out.
+
+        The pairs of one track i are computed at once, as rows of masked matrices. Rows are ranked once, and the
+        ranks without columns i and j are found by adjusting the ranks for the two values left out.
+        """
+        import numpy as np
+        from scipy.stats import rankdata
+
         corrDict = cls.createDistDict([cls.CORR_PEARSON, cls.CORR_SPEARMAN])
 
+        overlapMatrix = np.asarray(overlapMatrix, dtype=np.float64)
         size = len(overlapMatrix)
-        for i in range(0, size):
-            for j in range(i + 1, size):
-                vector1 = cls.modifyVector(overlapMatrix[i], i, j)
-                vector2 = cls.modifyVector(overlapMatrix[j], j, i)
-                cls.updateCorrDict(corrDict, vector1, vector2)
+        ranks = np.array([rankdata(row) for row in overlapMatrix]).reshape(size, size)
 
-        return corrDict
+        for i in range(0, size - 1):
+            others = np.arange(i + 1, size)
+            mask = np.ones((len(others), size), dtype=bool)
+            mask[:, i] = False
+            mask[np.arange(len(others)), others] = False
 
-    @classmethod
-    def modifyVector(cls, track, trackIndex, otherIndex):
+            values1 = np.tile(overlapMatrix[i], (len(others), 1))
+            values2 = overlapMatrix[others]
+            ranks1 = ranks[i] - cls._getRankShift(values1, overlapMatrix[i, i]) - \
+                cls._getRankShift(values1, overlapMatrix[i, others][:, np.newaxis])
+            ranks2 = ranks[others] - cls._getRankShift(values2, overlapMatrix[others, others][:, np.newaxis]) - \
+                cls._getRankShift(values2, overlapMatrix[others, i][:, np.newaxis])
 
-        lower = trackIndex
-        higher = otherIndex
+            correlations = cls.getRowCorrelations(values1, values2, mask, cls.getDistDictKeys(corrDict), ranks1, ranks2)
+            for corr in cls.getDistDictKeys(corrDict):
+                corrDict[corr].extend(correlations[corr])
 
-        if otherIndex < trackIndex:
-            lower = otherIndex
-            higher = trackIndex
+        return corrDict
 
-        return track[:lower] + track[lower + 1:higher] + track[higher + 1:]
+    @classmethod
+    def _getRankShift(cls, values, removed):
+        """
+        Change of the (average) ranks of values when the value removed is left out: 1 for larger values, and 0.5 for
+        ties.
+        """
+        return (values > removed) + 0.5 * (values == removed)
 
     @staticmethod
     def validateAndReturnErrors(choices):